@@ -0,0 +1,129 @@
+"""
+Non-interactive solving of many squares, one JSON record per line.
+
+Each input line is either {"size": 3, "equations": ["+-6", ...]} or
+[3, ["+-6", ...]]. Each output line is a JSON object with
+    line, size, equations,
+    status: "unique", "multiple", "unsolvable", "unknown" or "error",
+    solution_count: number of solutions found,
+    complete: false if the search stopped early because of max_solutions
+        or a budget, so that solution_count is only a lower bound,
+    stopped: why it stopped early, "solutions", "nodes" or "time" (only
+        if not complete); "unknown" means a budget ran out before a second
+        solution showed up,
+    solutions: up to max_solutions of them, as lists of the entries row
+        by row,
+    seconds: the time spent solving,
+    error: what went wrong (only with status "error").
+The records are streamed: the input is never loaded whole, and at most a
+small window of records is in flight at a time, even with a process pool.
+Outputs come in the same order as the inputs.
+"""
+
+
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from puzzle_class import Square
+from search_stats import BudgetExceeded, SearchStats
+from solution_options import iter_solutions
+
+
+def parse_record(line: str) -> tuple[int, list[str]]:
+    """The (size, equations) of one input line."""
+    record = json.loads(line)
+    if isinstance(record, dict):
+        return int(record["size"]), list(record["equations"])
+    size, equations = record
+    return int(size), list(equations)
+
+
+def solve_grid(size: int, equations: list[str],
+               max_solutions: int | None = None, max_nodes: int | None = None,
+               deadline: float | None = None) -> dict:
+    """
+    Solves one square within the budget, as the fields of a result (all
+    but line, size, equations and seconds). Invalid squares raise.
+
+    :param max_solutions: Stop after this many solutions.
+    :param max_nodes: Stop after this many search nodes.
+    :param deadline: Stop at this time.monotonic() value.
+    """
+    # Two solutions are always needed to tell "unique" from "multiple".
+    limit = None if max_solutions is None else max(max_solutions, 2)
+    stats = SearchStats(max_nodes=max_nodes, deadline=deadline)
+    found = []
+    stopped = None
+    try:
+        for entries in iter_solutions(Square(size, equations), limit=limit,
+                                      stats=stats):
+            found.append(list(entries))
+    except BudgetExceeded as exceeded:
+        stopped = exceeded.reason
+    if stopped is None and limit is not None and len(found) == limit:
+        stopped = "solutions"
+    if len(found) > 1:
+        status = "multiple"
+    elif stopped is not None:
+        status = "unknown"
+    else:
+        status = "unique" if found else "unsolvable"
+    result = dict(status=status, solution_count=len(found),
+                  complete=stopped is None, solutions=found[:max_solutions])
+    if stopped is not None:
+        result["stopped"] = stopped
+    return result
+
+
+def solve_record(line_number: int, line: str,
+                 max_solutions: int | None = None,
+                 max_nodes: int | None = None) -> dict:
+    """Solves one input line; any failure becomes an "error" result."""
+    result = {"line": line_number}
+    start = time.perf_counter()
+    try:
+        size, equations = parse_record(line)
+        result.update(size=size, equations=equations)
+        result.update(solve_grid(size, equations, max_solutions, max_nodes))
+    except Exception as error:
+        result.update(status="error", solution_count=0, complete=True,
+                      solutions=[], error=repr(error))
+    result["seconds"] = round(time.perf_counter() - start, 6)
+    return result
+
+
+def run_batch(source, destination, workers: int | None = None,
+              max_solutions: int | None = None, max_nodes: int | None = None):
+    """
+    Solves every record of source, writing one JSON result per line.
+
+    :param source: Iterable of input lines (e.g. an open file or sys.stdin).
+    :param destination: Where to write the results (has .write).
+    :param workers: Size of the process pool; None or 1 solves in-process.
+    :param max_solutions: Stop each search after this many solutions.
+    :param max_nodes: Stop each search after this many search nodes.
+    """
+    lines = ((number, line) for number, line in enumerate(source, start=1)
+             if line.strip())
+    if workers is None or workers <= 1:
+        for number, line in lines:
+            write_result(destination, solve_record(number, line,
+                                                   max_solutions, max_nodes))
+        return
+    window = 4 * workers  # Records in flight; keeps the memory bounded.
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        pending = deque()
+        for number, line in lines:
+            pending.append(executor.submit(solve_record, number, line,
+                                           max_solutions, max_nodes))
+            if len(pending) >= window:
+                write_result(destination, pending.popleft().result())
+        while pending:
+            write_result(destination, pending.popleft().result())
+
+
+def write_result(destination, result: dict):
+    """Writes one result as a JSON line, flushing so it streams out."""
+    destination.write(json.dumps(result) + "\n")
+    destination.flush()
@@ -0,0 +1,17 @@
+"""
+Reproducible timings of the solvers on a fixed corpus of squares.
+
+Run it from the src directory:
+    python -m benchmarks --output now.json
+    python -m benchmarks --baseline before.json --threshold 1.25
+The second form exits with status 1 if any timing got slower than the
+threshold allows, compared to the baseline file.
+"""
+
+
+from benchmarks.corpus import CORPUS, BenchmarkCase
+from benchmarks.runner import SOLVERS, find_regressions, run_benchmarks
+
+
+__all__ = ["CORPUS", "BenchmarkCase", "SOLVERS", "find_regressions",
+           "run_benchmarks"]
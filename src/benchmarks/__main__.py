@@ -0,0 +1,61 @@
+import json
+import sys
+from argparse import ArgumentParser
+from benchmarks import CORPUS, SOLVERS, find_regressions, run_benchmarks
+
+
+def parse_arguments():
+    parser = ArgumentParser(prog="python -m benchmarks",
+                            description="Times the solvers on a fixed corpus.")
+    parser.add_argument("--output", metavar="FILE",
+                        help="write the JSON results here")
+    parser.add_argument("--baseline", metavar="FILE",
+                        help="JSON results of an earlier run to compare to")
+    parser.add_argument("--threshold", type=float, default=1.25,
+                        help="allowed slowdown ratio against the baseline")
+    parser.add_argument("--noise-floor", type=float, default=0.001,
+                        help="skip comparing timings below these seconds")
+    parser.add_argument("--repeats", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--max-dimension", type=int, default=4,
+                        help="largest squares to run (5 takes minutes)")
+    parser.add_argument("--solvers", nargs="+", choices=list(SOLVERS),
+                        help="only these solvers")
+    parser.add_argument("--cases", nargs="+",
+                        help="only the corpus cases of these names")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    corpus = [case for case in CORPUS
+              if arguments.cases is None or case.name in arguments.cases]
+
+    def report(key, result):
+        flag = "" if result["correct"] is not False else "  WRONG ANSWER"
+        print(f"{key:45} median {result['median']:.6f}s{flag}",
+              file=sys.stderr)
+
+    current = run_benchmarks(corpus, arguments.solvers, arguments.repeats,
+                             arguments.warmup, arguments.max_dimension,
+                             report)
+    if arguments.output:
+        with open(arguments.output, "w") as file:
+            json.dump(current, file, indent=2, sort_keys=True)
+    else:
+        json.dump(current, sys.stdout, indent=2, sort_keys=True)
+        print()
+    if arguments.baseline:
+        with open(arguments.baseline) as file:
+            baseline = json.load(file)
+        regressions = find_regressions(current, baseline,
+                                       arguments.threshold,
+                                       arguments.noise_floor)
+        for key, before, after, ratio in regressions:
+            if ratio is None:
+                print(f"REGRESSION {key}: wrong number of solutions",
+                      file=sys.stderr)
+            else:
+                print(f"REGRESSION {key}: {before:.6f}s -> {after:.6f}s "
+                      f"({ratio:.2f}x)", file=sys.stderr)
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,46 @@
+"""
+The fixed corpus of squares. Each case records how many solutions it has,
+so the benchmark also checks that the solvers still agree on it.
+"""
+
+
+from collections import namedtuple
+
+
+BenchmarkCase = namedtuple("BenchmarkCase",
+                           ["name", "size", "equations", "solutions"])
+
+
+CORPUS = (
+    BenchmarkCase("small_22", 2, ("+6", "+4", "+5", "+5"), 2),
+    BenchmarkCase("unique_22", 2, ("+3", "+7", "+4", "+6"), 1),
+    BenchmarkCase("unsolvable_22", 2, ("*6", "+5", "+7", "*4"), 0),
+    BenchmarkCase("first_33", 3,
+                  ("+-6", "-*8", "*/3", "+-4", "-*3", "*/4"), 1),
+    BenchmarkCase("gmp_33", 3,
+                  ("/*2", "*-1", "+-4", "/*2", "*-1", "-+8"), 1),
+    BenchmarkCase("products_33", 3,
+                  ("**18", "*+18", "++20", "++18", "**18", "*-20"), 1),
+    BenchmarkCase("sums_33", 3,
+                  ("++16", "++15", "++14", "++15", "++15", "++15"), 18),
+    BenchmarkCase("unsolvable_33", 3,
+                  ("++1", "++15", "++14", "++15", "++15", "++15"), 0),
+    BenchmarkCase("order_16", 4,
+                  ("++-2", "*--15", "+-*96", "--/-1",
+                   "--/-1", "++-4", "*-+25", "+*/9"), 1),
+    BenchmarkCase("column_order_16", 4,
+                  ("--/-1", "++-4", "*-+25", "+*/9",
+                   "++-2", "*--15", "+-*96", "--/-1"), 1),
+    BenchmarkCase("multiple_44", 4,
+                  ("++-20", "++-11", "+++40", "--+13",
+                   "+++52", "+*-28", "--*-20", "+++34"), 9),
+    BenchmarkCase("unsolvable_44", 4,
+                  ("++-2", "*--15", "+-*96", "--/-1",
+                   "--/-1", "++-4", "*-+25", "+*/10"), 0),
+    BenchmarkCase("unique_55", 5,
+                  ("++**30096", "+-*+265", "-*+*4", "+--*-240", "+-+*145",
+                   "+--+2", "-**+-459", "+**-777", "+*-*5643", "**-*2320"), 1),
+    BenchmarkCase("unsolvable_55", 5,
+                  ("++**30096", "+-*+266", "-*+*4", "+--*-240", "+-+*145",
+                   "+--+2", "-**+-459", "+**-777", "+*-*5643", "**-*2320"), 0),
+)
@@ -0,0 +1,164 @@
+"""
+Times every solver on every case of the corpus (after warm-up runs) and
+compares the results against an earlier run.
+
+Every run starts from a fresh Square with empty equation caches (also the
+tables of equation_table and the mapped table files), so the timings of
+possibility_collapse include the setup, which is also timed on its own as
+"setup" (options_in_all_equations). A precomputed table file still makes
+the setup faster, so the meta of a run records which ones were found.
+"""
+
+
+import gc
+import platform
+import statistics
+import time
+from equation_tables import mapped_tables, table_path
+from puzzle_class import EQUATION_CACHE, TABLE_CACHE, Square
+from solution_options import permutation_bruteforce, possibility_collapse,\
+    primitive_row_recursion
+
+
+def _setup(grid: Square):
+    grid.options_in_all_equations()
+
+
+def _solution_count(found) -> int:
+    """The number of solutions in what possibility_collapse returns."""
+    if found is None:
+        return 0
+    return len(found) if isinstance(found, list) else 1
+
+
+def _collapse(grid: Square) -> int:
+    return _solution_count(possibility_collapse(grid))
+
+
+def _dlx(grid: Square) -> int:
+    return _solution_count(possibility_collapse(grid, backend="dlx"))
+
+
+def _row_recursion(grid: Square) -> int:
+    numbers = list(range(1, 1 + grid.dimension ** 2))
+    found = primitive_row_recursion(grid, numbers, 0, len(numbers) - 1)
+    return int(found is not None)
+
+
+def _bruteforce(grid: Square) -> int:
+    return int(permutation_bruteforce(grid) is not None)
+
+
+# name -> (function of a fresh Square, largest dimension it is run on,
+#          whether it counts all solutions rather than finding one).
+SOLVERS = {
+    "setup": (_setup, 5, None),
+    "possibility_collapse": (_collapse, 5, True),
+    "dlx": (_dlx, 3, True),
+    "primitive_row_recursion": (_row_recursion, 3, False),
+    "permutation_bruteforce": (_bruteforce, 3, False),
+}
+
+
+def time_once(solver, case) -> tuple[float, int | None]:
+    """One cold run of the solver on the case: (seconds, its result)."""
+    EQUATION_CACHE.clear()
+    TABLE_CACHE.clear()
+    mapped_tables.cache_clear()
+    grid = Square(case.size, list(case.equations))
+    gc.collect()
+    start = time.perf_counter()
+    result = solver(grid)
+    return time.perf_counter() - start, result
+
+
+def run_benchmarks(corpus, solvers=None, repeats: int = 5, warmup: int = 1,
+                   max_dimension: int = 4, report=None) -> dict:
+    """
+    Times the solvers on the cases of the corpus up to max_dimension.
+
+    :param corpus: The BenchmarkCases to run.
+    :param solvers: Names from SOLVERS (all of them if None).
+    :param repeats: Timed runs per case and solver.
+    :param warmup: Untimed runs before those.
+    :param report: Called with each finished result key, if given.
+    :return: A JSON-ready dict with "meta" and "results", the latter keyed
+        by "case/solver" with the min, median and mean seconds, all runs,
+        and whether the solver agreed with the expected solutions. The
+        meta has the table file used for each dimension run (or None).
+    """
+    results, tables = {}, {}
+    for case in corpus:
+        if case.size > max_dimension:
+            continue
+        if case.size not in tables:
+            path = table_path(case.size)
+            tables[case.size] = (path if mapped_tables(case.size) is not None
+                                else None)
+        for name in solvers or SOLVERS:
+            solver, largest, counts_all = SOLVERS[name]
+            if case.size > largest:
+                continue
+            for _ in range(warmup):
+                time_once(solver, case)
+            runs, answers = [], set()
+            for _ in range(repeats):
+                seconds, answer = time_once(solver, case)
+                runs.append(seconds)
+                answers.add(answer)
+            if counts_all is None:
+                correct = None
+            elif counts_all:
+                correct = answers == {case.solutions}
+            else:
+                correct = answers == {min(case.solutions, 1)}
+            key = f"{case.name}/{name}"
+            results[key] = {
+                "size": case.size,
+                "min": min(runs),
+                "median": statistics.median(runs),
+                "mean": statistics.fmean(runs),
+                "runs": runs,
+                "correct": correct,
+            }
+            if report is not None:
+                report(key, results[key])
+    meta = {
+        "python": platform.python_version(),
+        "implementation": platform.python_implementation(),
+        "machine": platform.machine(),
+        "repeats": repeats,
+        "warmup": warmup,
+        "max_dimension": max_dimension,
+        "tables": {str(size): path for size, path in sorted(tables.items())},
+    }
+    return {"meta": meta, "results": results}
+
+
+def find_regressions(current: dict, baseline: dict, threshold: float = 1.25,
+                     noise_floor: float = 0.001) -> list[tuple]:
+    """
+    Compares the medians of two run_benchmarks results.
+
+    :param threshold: Allowed ratio current / baseline.
+    :param noise_floor: Timings below this many seconds (in both) are too
+        noisy to compare and are skipped.
+    :return: (key, baseline median, current median, ratio) of every timing
+        that got slower than allowed, plus every solver that now disagrees
+        with the expected solutions (with a ratio of None).
+    """
+    regressions = []
+    for key, result in current["results"].items():
+        if result["correct"] is False:
+            regressions.append((key, None, result["median"], None))
+            continue
+        before = baseline["results"].get(key)
+        if before is None:
+            continue
+        if max(before["median"], result["median"]) < noise_floor:
+            continue
+        ratio = result["median"] / before["median"]
+        if ratio > threshold:
+            regressions.append((key, before["median"], result["median"],
+                                ratio))
+    return regressions
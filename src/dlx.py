@@ -0,0 +1,268 @@
+"""
+Solving arithmetic squares as an exact cover problem, with Knuth's
+dancing links (Algorithm C: exact covering with colors).
+
+The items are
+    one primary item per equation: it chooses exactly one of its combos,
+    two primary items per number 1..dim^2: one for the rows and one for
+        the columns, so that each holds the number in exactly one tile,
+    one secondary item per tile, coloured by the number in the tile.
+A combo of a row equation is an option covering the row, its numbers (of
+the rows) and its tiles (coloured by the numbers); a combo of a column
+equation covers the column, its numbers (of the columns) and its tiles.
+The rows alone would place every number once already; the numbers of the
+columns prune the search further, and the colours make the columns agree
+with the rows tile by tile.
+
+This is an alternative to the propagation search of solution_options, to
+compare it against; use it through possibility_collapse(grid,
+backend="dlx"). Its choices are cheap to make but prune far less than the
+propagation does, so it is only practical up to 3x3 in pure Python.
+"""
+
+
+class ExactCover:
+    """
+    Dancing links for exact cover with colours, in Knuth's layout: the item
+    headers are nodes 1..items, followed by the nodes of the options, each
+    option preceded by a spacer node (top <= 0).
+    """
+    def __init__(self, primary: int, secondary: int,
+                 options: list[list[tuple[int, int]]]):
+        """
+        :param primary: Number of primary items (covered exactly once).
+        :param secondary: Number of secondary items (covered at most once,
+            or any number of times with the same colour).
+        :param options: Each option as a list of (item, colour): items are
+            numbered from 1, primary first; colour 0 means no colour (the
+            only choice for primary items), otherwise a positive number.
+        """
+        items = primary + secondary
+        # The items still to cover, a doubly linked list through 0 (primary)
+        # and one through items + 1 (secondary):
+        self.llink = list(range(-1, items + 1))
+        self.rlink = list(range(1, items + 3))
+        self.llink[0], self.rlink[primary] = primary, 0
+        self.llink[items + 1], self.rlink[items + 1] = items, primary + 1
+        self.llink[primary + 1], self.rlink[items] = items + 1, items + 1
+        # The nodes; for item headers, top holds the length of the item:
+        self.top = [0] * (items + 1)
+        self.ulink = list(range(items + 1))
+        self.dlink = list(range(items + 1))
+        self.color = [0] * (items + 1)
+        self.option_of = [-1] * (items + 1)  # Node -> index of its option.
+        spacer = self._add_node(0, 0, -1)
+        for number, option in enumerate(options, start=1):
+            first = len(self.top)
+            for item, colour in option:
+                self._add_node(item, colour, number - 1)
+                self.top[item] += 1
+                node = len(self.top) - 1
+                self.ulink[node] = self.ulink[item]
+                self.dlink[node] = item
+                self.dlink[self.ulink[item]] = node
+                self.ulink[item] = node
+            self.dlink[spacer] = len(self.top) - 1
+            spacer = self._add_node(-number, 0, -1)
+            self.ulink[spacer] = first
+
+    def _add_node(self, top: int, colour: int, option: int) -> int:
+        self.top.append(top)
+        self.ulink.append(len(self.ulink))
+        self.dlink.append(len(self.dlink))
+        self.color.append(colour)
+        self.option_of.append(option)
+        return len(self.top) - 1
+
+    def _hide(self, p: int):
+        """Removes the other nodes of the option of p from their items."""
+        top, ulink, dlink, color = self.top, self.ulink, self.dlink, self.color
+        q = p + 1
+        while q != p:
+            x = top[q]
+            if x <= 0:
+                q = ulink[q]
+            elif color[q] < 0:
+                q += 1
+            else:
+                u, d = ulink[q], dlink[q]
+                dlink[u], ulink[d] = d, u
+                top[x] -= 1
+                q += 1
+
+    def _unhide(self, p: int):
+        top, ulink, dlink, color = self.top, self.ulink, self.dlink, self.color
+        q = p - 1
+        while q != p:
+            x = top[q]
+            if x <= 0:
+                q = dlink[q]
+            elif color[q] < 0:
+                q -= 1
+            else:
+                u, d = ulink[q], dlink[q]
+                dlink[u] = ulink[d] = q
+                top[x] += 1
+                q -= 1
+
+    def _cover(self, i: int):
+        p = self.dlink[i]
+        while p != i:
+            self._hide(p)
+            p = self.dlink[p]
+        left, right = self.llink[i], self.rlink[i]
+        self.rlink[left], self.llink[right] = right, left
+
+    def _uncover(self, i: int):
+        left, right = self.llink[i], self.rlink[i]
+        self.rlink[left] = self.llink[right] = i
+        p = self.ulink[i]
+        while p != i:
+            self._unhide(p)
+            p = self.ulink[p]
+
+    def _purify(self, p: int):
+        """Keeps only the options giving the item of p the colour of p."""
+        colour, i, color = self.color[p], self.top[p], self.color
+        q = self.dlink[i]
+        while q != i:
+            if color[q] == colour:
+                color[q] = -1
+            else:
+                self._hide(q)
+            q = self.dlink[q]
+
+    def _unpurify(self, p: int):
+        colour, i, color = self.color[p], self.top[p], self.color
+        q = self.ulink[i]
+        while q != i:
+            if color[q] < 0:
+                color[q] = colour
+            else:
+                self._unhide(q)
+            q = self.ulink[q]
+
+    def _commit(self, p: int):
+        if not self.color[p]:
+            self._cover(self.top[p])
+        elif self.color[p] > 0:
+            self._purify(p)
+
+    def _uncommit(self, p: int):
+        if not self.color[p]:
+            self._uncover(self.top[p])
+        elif self.color[p] > 0:
+            self._unpurify(p)
+
+    def _choose(self) -> int:
+        """The primary item with the fewest options left (0 if none)."""
+        best, best_length = 0, None
+        i = self.rlink[0]
+        while i:
+            length = self.top[i]
+            if best_length is None or length < best_length:
+                best, best_length = i, length
+                if not length:
+                    break
+            i = self.rlink[i]
+        return best
+
+    def solutions(self, chosen: list[int] | None = None, stats=None):
+        """
+        Yields every exact cover as a list of the indices of its options.
+        The links are restored once the generator finishes.
+
+        :param stats: An object with node(depth, option) and dead_end()
+            methods, told about every option tried; None for no such calls.
+        """
+        if chosen is None:
+            chosen = []
+        i = self._choose()
+        if not i:
+            yield [self.option_of[node] for node in chosen]
+            return
+        if stats is not None and not self.top[i]:
+            stats.dead_end()
+        self._cover(i)
+        node = self.dlink[i]
+        while node != i:
+            chosen.append(node)
+            if stats is not None:
+                stats.node(len(chosen), self.option_of[node])
+            p = node + 1
+            while p != node:
+                if self.top[p] <= 0:
+                    p = self.ulink[p]
+                else:
+                    self._commit(p)
+                    p += 1
+            yield from self.solutions(chosen, stats)
+            p = node - 1
+            while p != node:
+                if self.top[p] <= 0:
+                    p = self.dlink[p]
+                else:
+                    self._uncommit(p)
+                    p -= 1
+            chosen.pop()
+            node = self.dlink[node]
+        self._uncover(i)
+
+
+class _StatsAdapter:
+    """Turns the calls of ExactCover.solutions into SearchStats ones."""
+    def __init__(self, stats, option_combos):
+        self.stats = stats
+        self.option_combos = option_combos
+
+    def node(self, depth: int, option: int):
+        eq, combo = self.option_combos[option]
+        self.stats.node(depth, eq, combo, True)
+
+    def dead_end(self):
+        self.stats.dead_ends += 1
+
+
+def square_cover(dimension: int, options) -> tuple[ExactCover, list]:
+    """
+    The exact cover problem of a square.
+
+    :param options: Options of all equations, as options_in_all_equations.
+    :return: (the ExactCover, (equation, combo) of each of its options).
+    """
+    dim_squared = dimension * dimension
+    equations = 2 * dimension
+    # The numbers once for the rows and once more for the columns:
+    primary = equations + 2 * dim_squared
+    option_items, option_combos = [], []
+    for eq, (combos, _) in enumerate(options):
+        if eq < dimension:
+            tiles = range(eq * dimension, (eq + 1) * dimension)
+        else:
+            tiles = range(eq - dimension, dim_squared, dimension)
+        for combo in combos:
+            numbers = equations if eq < dimension else \
+                equations + dim_squared
+            items = [(eq + 1, 0)]
+            items += [(numbers + number, 0) for number in combo]
+            items += [(primary + 1 + tile, number)
+                      for tile, number in zip(tiles, combo)]
+            option_items.append(items)
+            option_combos.append((eq, tuple(combo)))
+    return ExactCover(primary, dim_squared, option_items), option_combos
+
+
+def dlx_solutions(dimension: int, options, stats=None):
+    """
+    Yields the solutions of the square as tuples of the entries, row by
+    row, just like solution_options.iter_solutions (in another order).
+
+    :param options: Options of all equations, as options_in_all_equations.
+    :param stats: A SearchStats to count the nodes and dead ends in.
+    """
+    cover, option_combos = square_cover(dimension, options)
+    tracer = None if stats is None else _StatsAdapter(stats, option_combos)
+    for chosen in cover.solutions(stats=tracer):
+        rows = sorted(option_combos[option] for option in chosen
+                      if option_combos[option][0] < dimension)
+        yield tuple(number for _, combo in rows for number in combo)
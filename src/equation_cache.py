@@ -0,0 +1,75 @@
+"""
+A bounded, least-recently-used cache for the per-equation combo tables.
+
+The combos of an equation only depend on the dimension of the square, the
+operations and the target, so squares sharing an equation (for instance all
+the masks tried by given_result_list) can share one enumeration.
+The cached values are immutable (tuples and frozensets), which means that
+handing out the very same object to every caller is safe.
+"""
+
+
+from collections import OrderedDict, namedtuple
+
+
+CacheInfo = namedtuple("CacheInfo",
+                       ["hits", "misses", "evictions", "size", "maxsize"])
+
+
+class EquationCache:
+    def __init__(self, maxsize: int = 512):
+        assert maxsize > 0, "The cache needs room for at least one table."
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._tables = OrderedDict()
+
+    def __len__(self):
+        return len(self._tables)
+
+    def __contains__(self, key):
+        return key in self._tables
+
+    def get(self, key, compute):
+        """
+        Returns the cached value of key, computing and storing it first if
+        it is missing. The least recently used entry is evicted when full.
+
+        :param key: (dimension, operations, target), or (dimension,
+            operations) for whole tables.
+        :param compute: Called with no arguments on a miss.
+        :return: The (immutable) cached value.
+        """
+        try:
+            value = self._tables[key]
+        except KeyError:
+            self.misses += 1
+            value = compute()
+            self._tables[key] = value
+            self._shrink_to(self.maxsize)
+            return value
+        self.hits += 1
+        self._tables.move_to_end(key)
+        return value
+
+    def resize(self, maxsize: int):
+        """Changes the capacity, evicting the oldest entries if needed."""
+        assert maxsize > 0, "The cache needs room for at least one table."
+        self.maxsize = maxsize
+        self._shrink_to(maxsize)
+
+    def _shrink_to(self, size: int):
+        while len(self._tables) > size:
+            self._tables.popitem(last=False)
+            self.evictions += 1
+
+    def info(self) -> CacheInfo:
+        """Hit/miss/eviction counters together with the current size."""
+        return CacheInfo(self.hits, self.misses, self.evictions,
+                         len(self._tables), self.maxsize)
+
+    def clear(self):
+        """Empties the cache and resets the counters."""
+        self._tables.clear()
+        self.hits = self.misses = self.evictions = 0
@@ -0,0 +1,229 @@
+"""
+Precomputed equation tables on disk.
+
+For one dimension, the file holds every operator string (or the chosen
+ones) with all the targets it can reach and the combos reaching them, in
+the order enumerate_equation gives them. The solver memory-maps the file,
+so every process using it shares the same page-cached copy, and reads the
+combos of an equation straight from the mapping. Equations that are not in
+the file are enumerated as usual.
+
+The file (little-endian) is
+    header: magic, version, dimension, operator strings, entries,
+    directory: per operator string, its bytes, its first entry and the
+        number of its entries (one entry per reachable target),
+    the targets of all entries (int64, increasing per operator string),
+    their offsets into the combo data (uint64),
+    their numbers of combos (uint32),
+    the combo data: one byte per number, combo after combo.
+The header and the directory are padded to a multiple of 8 bytes.
+
+Precompute a table with
+    python equation_tables.py 4
+which writes tables/equations_4.bin next to this module (or into the
+directory of the ARITHMETIC_SQUARES_TABLES environment variable, which is
+also where the solver looks). All operator strings of a 5x5 square take
+gigabytes, so --operations can pick the ones to include.
+"""
+
+
+import mmap
+import os
+import struct
+import warnings
+from argparse import ArgumentParser
+from bisect import bisect_left
+from functools import lru_cache
+from itertools import combinations, permutations, product
+
+
+MAGIC = b"ASQT"
+VERSION = 1
+HEADER = struct.Struct("<4sBBHII")
+DIRECTORY_ENTRY = struct.Struct("<II")
+TABLE_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               "tables")
+
+
+def _padded(size: int) -> int:
+    return -(-size // 8) * 8
+
+
+def table_path(dimension: int, directory: str | None = None) -> str:
+    """Where the table of the dimension is written and looked for: in the
+    directory, by default the one of ARITHMETIC_SQUARES_TABLES (read at
+    each call) or else TABLE_DIRECTORY."""
+    if directory is None:
+        directory = os.environ.get("ARITHMETIC_SQUARES_TABLES",
+                                   TABLE_DIRECTORY)
+    return os.path.join(directory, f"equations_{dimension}.bin")
+
+
+class EquationTables:
+    """A memory-mapped table file (see the module docstring)."""
+    def __init__(self, path: str):
+        with open(path, "rb") as file:
+            self._map = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        view = memoryview(self._map)
+        magic, version, self.dimension, _, op_count, entry_count = \
+            HEADER.unpack_from(view)
+        if magic != MAGIC or version != VERSION:
+            raise ValueError(f"{path} is not an equation table file.")
+        ops_length = self.dimension - 1
+        record = ops_length + DIRECTORY_ENTRY.size
+        position = HEADER.size
+        self._directory = {}  # Operations -> (first entry, entry count).
+        for _ in range(op_count):
+            operations = bytes(view[position:position + ops_length]).decode()
+            self._directory[operations] = DIRECTORY_ENTRY.unpack_from(
+                view, position + ops_length)
+            position += record
+        position = _padded(position)
+        self._targets = view[position:position + 8 * entry_count].cast("q")
+        position += 8 * entry_count
+        self._offsets = view[position:position + 8 * entry_count].cast("Q")
+        position += 8 * entry_count
+        self._counts = view[position:position + 4 * entry_count].cast("I")
+        self._data = view[position + 4 * entry_count:]
+
+    def __contains__(self, operations: str) -> bool:
+        return operations in self._directory
+
+    def operations(self) -> list[str]:
+        """The operator strings in the file."""
+        return list(self._directory)
+
+    def _combos_at(self, entry: int) -> tuple[tuple[int]]:
+        dimension = self.dimension
+        start = self._offsets[entry]
+        data = self._data[start:start + self._counts[entry] * dimension]
+        return tuple(zip(*(data[k::dimension] for k in range(dimension))))
+
+    def combos(self, operations: str, target: int) -> tuple | None:
+        """
+        The combos of the equation, read from the mapping.
+
+        :return: The combos (empty if the target cannot be reached), or None
+            if the operations are not in the file.
+        """
+        try:
+            first, count = self._directory[operations]
+        except KeyError:
+            return None
+        entry = bisect_left(self._targets, target, first, first + count)
+        if entry == first + count or self._targets[entry] != target:
+            return ()
+        return self._combos_at(entry)
+
+    def items(self, operations: str):
+        """Yields (target, combos) for every target of the operations."""
+        first, count = self._directory[operations]
+        for entry in range(first, first + count):
+            yield self._targets[entry], self._combos_at(entry)
+
+
+@lru_cache(maxsize=None)
+def mapped_tables(dimension: int) -> EquationTables | None:
+    """The table file of the dimension, mapped once per process; None if
+    there is none (or it cannot be read, with a warning)."""
+    path = table_path(dimension)
+    if not os.path.exists(path):
+        return None
+    try:
+        tables = EquationTables(path)
+    except (OSError, ValueError, struct.error) as error:
+        warnings.warn(f"Ignoring the equation table {path}: {error!r}")
+        return None
+    if tables.dimension != dimension:
+        warnings.warn(f"Ignoring the equation table {path}: it is for "
+                      f"dimension {tables.dimension}.")
+        return None
+    return tables
+
+
+def bucket_operations(dimension: int, operations: str) -> dict[int, bytes]:
+    """target -> the combos reaching it, as bytes, for one operator string."""
+    from puzzle_class import compile_equation
+    evaluate = compile_equation(operations).evaluate
+    buckets = {}
+    for combo in combinations(range(1, 1 + dimension ** 2), dimension):
+        for entries in permutations(combo):
+            result = evaluate(entries)
+            if result.denominator == 1:
+                buckets.setdefault(int(result), bytearray()).extend(entries)
+    return buckets
+
+
+def write_tables(dimension: int, path: str,
+                 operations: list[str] | None = None, report=None):
+    """
+    Precomputes the table file of the dimension. It is written next to
+    path first and then moved into place, so that readers never see a
+    half-written file. The temporary files are removed even if writing
+    fails or is interrupted.
+
+    :param operations: The operator strings to include (all if None).
+    :param report: Called with each operator string once it is done.
+    """
+    assert 2 <= dimension and dimension * dimension < 256,\
+        "The numbers have to fit in a byte."
+    if operations is None:
+        operations = ["".join(ops)
+                      for ops in product("+-*/", repeat=dimension - 1)]
+    assert all(len(ops) == dimension - 1 and set(ops) <= set("+-*/")
+               for ops in operations), "Operations need to be some of +-*/."
+    operations = sorted(set(operations))
+    directory, targets, offsets, counts = [], [], [], []
+    temporary = path + ".tmp"
+    data_path = path + ".data.tmp"
+    offset = 0
+    try:
+        with open(data_path, "wb") as data:
+            for ops in operations:
+                buckets = bucket_operations(dimension, ops)
+                directory.append((ops, len(targets), len(buckets)))
+                for target in sorted(buckets):
+                    targets.append(target)
+                    offsets.append(offset)
+                    counts.append(len(buckets[target]) // dimension)
+                    data.write(buckets[target])
+                    offset += len(buckets[target])
+                if report is not None:
+                    report(ops)
+        with open(temporary, "wb") as file:
+            file.write(HEADER.pack(MAGIC, VERSION, dimension, 0,
+                                   len(directory), len(targets)))
+            size = HEADER.size
+            for ops, first, count in directory:
+                file.write(ops.encode() + DIRECTORY_ENTRY.pack(first, count))
+                size += dimension - 1 + DIRECTORY_ENTRY.size
+            file.write(bytes(_padded(size) - size))
+            file.write(struct.pack(f"<{len(targets)}q", *targets))
+            file.write(struct.pack(f"<{len(offsets)}Q", *offsets))
+            file.write(struct.pack(f"<{len(counts)}I", *counts))
+            with open(data_path, "rb") as data:
+                while chunk := data.read(1 << 20):
+                    file.write(chunk)
+        os.replace(temporary, path)
+    finally:
+        if os.path.exists(data_path):
+            os.remove(data_path)
+        if os.path.exists(temporary):
+            os.remove(temporary)
+
+
+if __name__ == '__main__':
+    parser = ArgumentParser(description="Precomputes the equation table "
+                                        "file of a dimension.")
+    parser.add_argument("size", type=int, help="Dimension of the squares.")
+    parser.add_argument("--operations", nargs="+", default=None,
+                        help="Operator strings to include (default: all).")
+    parser.add_argument("--output", default=None,
+                        help="Where to write it (default: where the solver "
+                             "looks for it).")
+    arguments = parser.parse_args()
+    output = arguments.output or table_path(arguments.size)
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    write_tables(arguments.size, output, arguments.operations,
+                 report=lambda ops: print(ops, "done", flush=True))
+    print("Wrote", output)
@@ -0,0 +1,210 @@
+"""
+Generation of uniquely solvable squares.
+
+A candidate is made by shuffling 1..dim^2 into the grid, picking the
+operations of every row and column at random and evaluating them
+left-to-right, just like Square.check_row does. Lines whose result is not
+an integer get new operations. The candidate is kept if the solver finds
+exactly one solution (the search stops at the second one, so non-unique
+candidates are cheap to throw away) and if the search needed a number of
+nodes within the asked-for range, which is a rough measure of difficulty.
+
+Every candidate has its own seed, drawn from the seed of the whole run, so
+the same seed gives the same puzzles in the same order, with or without
+a process pool.
+
+Run as a script, the accepted puzzles are written as JSON lines
+    {"size": 3, "equations": ["+-6", ...], "solution": [...], "nodes": 7}
+which main.py --batch reads as they are.
+"""
+
+
+import json
+import random
+import sys
+from argparse import ArgumentParser
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+from puzzle_class import TABLE_CACHE, Square, compile_equation
+from search_stats import SearchStats
+from solution_options import iter_solutions, mask_options
+
+
+Puzzle = namedtuple("Puzzle", ["dimension", "equations", "solution", "nodes"])
+
+
+def random_equations(dimension: int, entries: list[int], rng: random.Random,
+                     operations: str = "+-*/",
+                     tries: int = 20) -> list[str] | None:
+    """
+    Random equations (rows first, then columns) that the entries solve.
+
+    :param entries: The filled-in square, row by row.
+    :param operations: The operations to choose from.
+    :param tries: How many times to redraw the operations of a line whose
+        result is not an integer.
+    :return: The equations, or None if some line never gave an integer.
+    """
+    lines = [entries[start:start + dimension]
+             for start in range(0, dimension * dimension, dimension)]
+    lines += [entries[index::dimension] for index in range(dimension)]
+    equations = []
+    for line in lines:
+        for _ in range(tries):
+            line_operations = "".join(rng.choice(operations)
+                                      for _ in range(dimension - 1))
+            result = compile_equation(line_operations).evaluate(line)
+            if result.denominator == 1:
+                equations.append(line_operations + str(int(result)))
+                break
+        else:
+            return None
+    return equations
+
+
+def try_candidate(dimension: int, seed: int, operations: str = "+-*/",
+                  min_nodes: int = 0,
+                  max_nodes: int | None = None) -> Puzzle | None:
+    """
+    Makes the candidate of the seed and checks it.
+
+    :return: The Puzzle if it is uniquely solvable and its search took
+        between min_nodes and max_nodes nodes, otherwise None.
+    """
+    rng = random.Random(seed)
+    entries = list(range(1, dimension * dimension + 1))
+    rng.shuffle(entries)
+    equations = random_equations(dimension, entries, rng, operations)
+    if equations is None:
+        return None
+    options = None
+    if dimension <= 4:
+        # The bucketed tables are quick to build up to 4x4, and are shared
+        # by all the candidates a process checks, as long as TABLE_CACHE
+        # has room for one table per operator string that can be drawn.
+        minus = dimension - 1
+        strings = len(set(operations)) ** minus
+        if TABLE_CACHE.maxsize < strings:
+            TABLE_CACHE.resize(strings)
+        line_operations = [equation[:minus] for equation in equations]
+        targets = [int(equation[minus:]) for equation in equations]
+        options = mask_options(dimension, line_operations, targets)
+    stats = SearchStats()
+    solutions = list(iter_solutions(Square(dimension, equations), limit=2,
+                                    options=options, stats=stats))
+    if len(solutions) != 1:
+        return None
+    if stats.nodes < min_nodes or (max_nodes is not None
+                                   and stats.nodes > max_nodes):
+        return None
+    return Puzzle(dimension, equations, solutions[0], stats.nodes)
+
+
+def _try_candidates(dimension: int, seeds: list[int], operations: str,
+                    min_nodes: int, max_nodes: int | None) -> list[Puzzle]:
+    """The accepted puzzles among the candidates of the seeds, in order."""
+    puzzles = []
+    for seed in seeds:
+        puzzle = try_candidate(dimension, seed, operations, min_nodes,
+                               max_nodes)
+        if puzzle is not None:
+            puzzles.append(puzzle)
+    return puzzles
+
+
+def generate_puzzles(dimension: int, count: int | None = None,
+                     seed: int | None = None, operations: str = "+-*/",
+                     min_nodes: int = 0, max_nodes: int | None = None,
+                     workers: int | None = None, chunksize: int = 16):
+    """
+    Lazily yields uniquely solvable Puzzles, as they are accepted.
+
+    :param dimension: The dimension of the squares.
+    :param count: Stop after this many puzzles (None: never stop).
+    :param seed: Seed of the run; None for a random one.
+    :param operations: The operations the equations may use.
+    :param min_nodes: Only keep puzzles whose search needed at least...
+    :param max_nodes: ... and at most this many nodes (None: no bound).
+    :param workers: Checks the candidates on a process pool of this size;
+        None or 1 checks them in-process. The puzzles are the same and
+        come in the same order either way.
+    :param chunksize: How many candidates one task of the pool checks.
+    """
+    assert dimension >= 2, "The square needs to be at least 2x2."
+    assert all(operation in "+-*/" for operation in operations) \
+        and operations, "Operations need to be some of +-*/."
+    if count is not None and count <= 0:
+        return
+    rng = random.Random(seed)
+
+    def seed_chunks():
+        while True:
+            yield [rng.getrandbits(64) for _ in range(chunksize)]
+
+    produced = 0
+    if workers is None or workers <= 1:
+        for seeds in seed_chunks():
+            for puzzle in _try_candidates(dimension, seeds, operations,
+                                          min_nodes, max_nodes):
+                yield puzzle
+                produced += 1
+                if produced == count:
+                    return
+    window = 2 * workers  # Tasks in flight; enough to keep the pool busy.
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pending = deque()
+        chunks = seed_chunks()
+        while True:
+            while len(pending) < window:
+                pending.append(executor.submit(_try_candidates, dimension,
+                                               next(chunks), operations,
+                                               min_nodes, max_nodes))
+            for puzzle in pending.popleft().result():
+                yield puzzle
+                produced += 1
+                if produced == count:
+                    return
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def parse_arguments():
+    parser = ArgumentParser(description="Generates uniquely solvable "
+                                        "arithmetic squares as JSON lines.")
+    parser.add_argument("size", type=int, help="Dimension of the squares.")
+    parser.add_argument("-n", "--count", type=int, default=10,
+                        help="How many puzzles to generate (default 10).")
+    parser.add_argument("--seed", type=int, default=None,
+                        help="Seed, for reproducible runs.")
+    parser.add_argument("--operations", default="+-*/",
+                        help="Operations to use (default +-*/).")
+    parser.add_argument("--min-nodes", type=int, default=0,
+                        help="Only keep puzzles whose search needs at least "
+                             "this many nodes.")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="... and at most this many nodes.")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="Check candidates on this many processes.")
+    parser.add_argument("--output", default="-",
+                        help="Output file; - for stdout (default).")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    destination = (sys.stdout if arguments.output == "-"
+                   else open(arguments.output, "w", encoding="utf-8"))
+    try:
+        for found in generate_puzzles(arguments.size, arguments.count,
+                                      arguments.seed, arguments.operations,
+                                      arguments.min_nodes, arguments.max_nodes,
+                                      arguments.workers):
+            destination.write(json.dumps({"size": found.dimension,
+                                          "equations": found.equations,
+                                          "solution": list(found.solution),
+                                          "nodes": found.nodes}) + "\n")
+            destination.flush()
+    finally:
+        if destination is not sys.stdout:
+            destination.close()
@@ -1,8 +1,45 @@
+import sys
+from argparse import ArgumentParser
+from batch import run_batch
 from puzzle_class import Square
-from solution_options import possibility_collapse
+from solution_options import first_and_count, iter_solutions
+
+
+# Counting stops here; beyond it the summary only says "at least".
+COUNT_CAP = 100000
+
+
+def parse_arguments():
+    parser = ArgumentParser(description="Solver of arithmetic squares. "
+                            "Interactive unless --batch is given.")
+    parser.add_argument("--batch", metavar="FILE",
+                        help="solve the JSON lines of FILE (- for stdin), "
+                             "see batch.py for the format")
+    parser.add_argument("--output", metavar="FILE", default="-",
+                        help="where to write the JSON results (- for stdout)")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="size of the process pool for --batch")
+    parser.add_argument("--max-solutions", type=int, default=None,
+                        help="stop each search after this many solutions")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="stop each search after this many search nodes")
+    return parser.parse_args()
+
+
+def batch_mode(arguments):
+    source = sys.stdin if arguments.batch == "-" else open(arguments.batch)
+    destination = sys.stdout if arguments.output == "-" \
+        else open(arguments.output, "w")
+    with source, destination:
+        run_batch(source, destination, arguments.workers,
+                  arguments.max_solutions, arguments.max_nodes)
 
 
 if __name__ == '__main__':
+    arguments = parse_arguments()
+    if arguments.batch is not None:
+        batch_mode(arguments)
+        sys.exit()
     print("Welcome to the solver of arithmetic squares.")
     print("Would you like to revise the rules [r] "
           "or have the computer solve [s] one for you?")
@@ -82,10 +119,18 @@ if __name__ == '__main__':
         except AssertionError:
             print("You have not specified the correct amount of equations. "
                   "Try again, please.")
-    all_solutions = possibility_collapse(solver_object)
     print("\n\n--------------------------------------------------------------")
-    if isinstance(all_solutions, list):
-        print(f"The program found {len(all_solutions)} solutions to this grid.")
+    # One search counts the solutions (up to COUNT_CAP) and keeps the first:
+    first, solution_count = first_and_count(solver_object, COUNT_CAP)
+    if solution_count == 1:
+        print("There is precisely one solution, namely this one:\n")
+        print(solver_object.copy_with_entries(first))
+    elif solution_count:
+        if solution_count < COUNT_CAP:
+            print(f"The program found {solution_count} solutions to this grid.")
+        else:
+            print(f"The program found at least {COUNT_CAP} solutions "
+                  f"to this grid.")
         choice = input("Would you like to see one of them [type o and press "
                        "ENTER]\nOR\nwould you like to see all of them [type "
                        "a and press ENTER]?")
@@ -95,12 +140,13 @@ if __name__ == '__main__':
                   "or all of them [a]?")
             choice = input()
         if choice == "o":
-            print(all_solutions[0])
-        else:  # See all solutions.
-            for s in all_solutions:
-                print(s)
-    elif isinstance(all_solutions, Square):
-        print("There is precisely one solution, namely this one:\n")
-        print(all_solutions)
+            print(solver_object.copy_with_entries(first))
+        else:
+            # The solutions are printed as soon as they are found, all
+            # through one copy of the square (only its entries change):
+            shown = solver_object.clone()
+            for entries in iter_solutions(solver_object):
+                shown.change_entries(entries)
+                print(shown)
     else:
         print("Sorry, there are no solutions for this grid.")
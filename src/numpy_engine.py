@@ -0,0 +1,111 @@
+"""
+A NumPy alternative to enumerate_equation.
+
+All tuples of distinct numbers from 1..dim^2 are generated as an integer
+matrix (one tuple per row, in the same order as
+permutations(combinations(...)) would give them), and an equation is
+evaluated on all rows at once, column by column. The running result is
+kept as an exact fraction numerator / denominator, so division needs no
+floats; a row matches a target only if the fraction is that integer.
+
+The matrix is built from chunks of combinations to cap the memory use,
+which matters at dimension 5 (6 375 600 rows).
+
+NumPy is optional: this module is only imported when engine="numpy" is
+asked for (see Square.options_in_all_equations).
+"""
+
+
+from itertools import combinations, permutations
+import numpy as np
+from puzzle_class import OPERATIONS, enumerate_equation
+
+
+def tuple_matrices(dimension: int, chunk_combinations: int = 4096):
+    """
+    Yields matrices whose rows are all tuples of distinct numbers
+    from 1..dim^2, in the order of permutations(combinations(...)).
+
+    :param dimension: The dimension of the square.
+    :param chunk_combinations: How many combinations one matrix covers.
+    """
+    orders = np.array(list(permutations(range(dimension))), dtype=np.int64)
+    combos = np.array(list(combinations(range(1, 1 + dimension ** 2),
+                                        dimension)), dtype=np.int64)
+    for start in range(0, len(combos), chunk_combinations):
+        chunk = combos[start:start + chunk_combinations]
+        # chunk[:, orders] has shape (combinations, permutations, dimension).
+        yield chunk[:, orders].reshape(-1, dimension)
+
+
+def evaluate_matrix(operations: str, matrix: np.ndarray):
+    """
+    Evaluates the operations left-to-right on every row of the matrix.
+
+    :return: (numerators, denominators) of the exact results, reduced.
+    """
+    numerators = matrix[:, 0].copy()
+    denominators = np.ones_like(numerators)
+    for column, operation in enumerate(operations, start=1):
+        numbers = matrix[:, column]
+        match operation:
+            case "+":
+                numerators += denominators * numbers
+            case "-":
+                numerators -= denominators * numbers
+            case "*":
+                numerators *= numbers
+            case "/":
+                denominators *= numbers
+            case _:
+                raise (ValueError(f"{operation} is not one of"
+                                  f"the four operations"))
+        if operation in "*/":
+            common = np.gcd(numerators, denominators)
+            numerators //= common
+            denominators //= common
+    return numerators, denominators
+
+
+def bucket_targets(dimension: int, operations: str, targets,
+                   chunk_combinations: int = 4096) -> dict[int, list]:
+    """
+    One pass over all tuples for the operations, collecting the tuples that
+    evaluate to each of the targets.
+
+    :return: target -> list of tuples (in the usual order) for every target.
+    """
+    assert all(operation in OPERATIONS for operation in operations),\
+        "Operation is not one of +-*/."
+    targets = sorted(set(targets))
+    wanted = np.array(targets, dtype=np.int64)
+    buckets = {target: [] for target in targets}
+    for matrix in tuple_matrices(dimension, chunk_combinations):
+        numerators, denominators = evaluate_matrix(operations, matrix)
+        integral = denominators == 1
+        hits = integral & np.isin(numerators, wanted)
+        for row, value in zip(matrix[hits].tolist(),
+                              numerators[hits].tolist()):
+            buckets[value].append(tuple(row))
+    return buckets
+
+
+def enumerate_equation_numpy(dimension: int, operations: str, target: int,
+                             chunk_combinations: int = 4096):
+    """Same as puzzle_class.enumerate_equation, evaluated in bulk."""
+    return bucket_targets(dimension, operations, [target],
+                          chunk_combinations)[target]
+
+
+def verify_against_python(dimension: int, operations: str, targets) -> bool:
+    """Checks that both engines give the very same combos for the targets."""
+    buckets = bucket_targets(dimension, operations, targets)
+    return all(buckets[target] ==
+               enumerate_equation(dimension, operations, target)
+               for target in targets)
+
+
+if __name__ == '__main__':
+    for ops in ["+-", "*/", "/*", "-*", "//"]:
+        print(ops, verify_against_python(3, ops, range(-20, 80)))
+    print("/-*", verify_against_python(4, "/-*", range(-10, 60)))
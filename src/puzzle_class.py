@@ -21,67 +21,375 @@ this class makes an object representing the square:
 """
 
 
+from array import array
+from equation_cache import EquationCache
+from equation_tables import mapped_tables
+from fractions import Fraction
+from functools import lru_cache, partial
 from itertools import combinations, permutations
 from math import ceil, log10
+from operator import add, mul, sub
+from search_stats import check_deadline
+from types import MappingProxyType
 
 
-class Square:
-    def __init__(self, dimension: int, operations_and_results: list[str]):
+def exact_divide(left, right: int):
+    """Division that stays exact: an int whenever right divides left,
+    otherwise a Fraction (which a later multiplication may turn back)."""
+    quotient, remainder = divmod(left, right)
+    return quotient if not remainder else Fraction(left, right)
+
+
+OPERATIONS = {"+": add, "-": sub, "*": mul, "/": exact_divide}
+
+
+def apply_operation(operation: str, left, right: int):
+    """Evaluates a single step of an equation, left-to-right."""
+    try:
+        return OPERATIONS[operation](left, right)
+    except KeyError:
+        raise (ValueError(f"{operation} is not one of the four operations"))
+
+
+class CompiledEquation:
+    """
+    The operations of an equation, compiled once:
+        - steps: a tuple of the functions applied left-to-right,
+        - evaluate: a generated function of the entries, which for "+*/"
+          computes divide(((e[0] + e[1]) * e[2]), e[3]) in one expression.
+    Shared by check_row, check_column and enumerate_equation.
+    """
+    __slots__ = ("operations", "steps", "evaluate")
+
+    def __init__(self, operations: str):
+        self.operations = operations
+        expression = "entries[0]"
+        for index, operation in enumerate(operations, start=1):
+            if operation not in OPERATIONS:
+                raise (ValueError(f"{operation} is not one of"
+                                  f"the four operations"))
+            if operation == "/":
+                expression = f"divide({expression}, entries[{index}])"
+            else:
+                expression = f"({expression} {operation} entries[{index}])"
+        self.steps = tuple(OPERATIONS[operation] for operation in operations)
+        self.evaluate = eval(f"lambda entries: {expression}",
+                             {"divide": exact_divide})
+
+
+@lru_cache(maxsize=None)
+def compile_equation(operations: str) -> CompiledEquation:
+    """The (shared) compiled form of the given operations."""
+    return CompiledEquation(operations)
+
+
+def reachable_interval(value, operations: str, smallest: int, largest: int):
+    """
+    Bounds every result that can be reached from value by applying the given
+    operations to numbers from [smallest, largest]. All the numbers are
+    positive, so each step is monotone in both of its arguments and it is
+    enough to look at the endpoints.
+
+    :param value: The partial, left-to-right, result so far.
+    :param operations: The operations that still have to be applied.
+    :param smallest: Smallest number that can still be used.
+    :param largest: Largest number that can still be used.
+    :return: (lowest, highest) reachable result.
+    """
+    low = high = value
+    for operation in operations:
+        match operation:
+            case "+":
+                low, high = low + smallest, high + largest
+            case "-":
+                low, high = low - largest, high - smallest
+            case "*" | "/":
+                ends = [apply_operation(operation, a, b)
+                        for a in (low, high) for b in (smallest, largest)]
+                low, high = min(ends), max(ends)
+            case _:
+                raise (ValueError(f"{operation} is not one of"
+                                  f"the four operations"))
+    return low, high
+
+
+def enumerate_equation(
+    dimension: int, operations: str, target: int,
+    deadline: float | None = None
+) -> list[tuple[int]]:
+    """
+    Depth-first search for every tuple of distinct numbers from 1..dim^2
+    that evaluates (left-to-right) to the target.
+
+    The tuple is built one operand at a time. A branch is cut as soon as the
+    target falls outside the interval reachable with the remaining operations
+    and unused numbers, or when the partial result is not an integer and no
+    multiplication is left to make it one again.
+
+    The combinations come out in the same order as
+    permutations(combinations(...)) would produce them.
+    A 5x5 equation can take seconds, so the deadline (a time.monotonic()
+    value) is checked for every pair of first two operands; past it,
+    BudgetExceeded is raised.
+    """
+    found = []
+    steps = compile_equation(operations).steps
+
+    def extend(chosen: tuple[int], value, unused: tuple[int]):
+        step = len(chosen) - 1
+        if step == len(operations):
+            if value == target:
+                found.append(chosen)
+            return
+        if step == 1:
+            check_deadline(deadline)
+        remaining = operations[step:]
+        if value % 1 and "*" not in remaining:
+            # Adding, subtracting or dividing never gives an integer back.
+            return
+        low, high = reachable_interval(value, remaining, unused[0], unused[-1])
+        if not low <= target <= high:
+            return
+        for index, number in enumerate(unused):
+            extend(chosen + (number,), steps[step](value, number),
+                   unused[:index] + unused[index + 1:])
+
+    numbers = tuple(range(1, 1 + dimension ** 2))
+    for first_index, first in enumerate(numbers):
+        extend((first,), first, numbers[:first_index] + numbers[first_index+1:])
+    found.sort(key=lambda entries: (sorted(entries), entries))
+    return found
+
+
+EQUATION_CACHE = EquationCache()
+# Whole tables of equation_table, keyed by (dimension, operations). One
+# table of a 5x5 square holds millions of combos, hence far fewer of them.
+TABLE_CACHE = EquationCache(maxsize=16)
+
+
+def with_tiles(dimension: int, combos) -> tuple[tuple[tuple[int]],
+                                               tuple[frozenset[int]]]:
+    """Freezes the combos together with the numbers that appear at least once
+    at each position of them."""
+    combos = tuple(combos)
+    tiles = tuple(frozenset(entries[index] for entries in combos)
+                  for index in range(dimension))
+    return combos, tiles
+
+
+def equation_options(
+    dimension: int, operations: str, target: int, engine: str = "python",
+    deadline: float | None = None
+) -> tuple[tuple[tuple[int]], tuple[frozenset[int]]]:
+    """Cached combos of one equation, together with the numbers that
+    appear at least once at each position of them.
+    On a cache miss they are read from the precomputed table file of the
+    dimension (see equation_tables) if it has the operations, and otherwise
+    enumerated by the given engine, either "python" (enumerate_equation) or
+    "numpy" (numpy_engine, NumPy needed). The python engine stops at the
+    deadline, see enumerate_equation."""
+    match engine:
+        case "python":
+            enumerate_combos = partial(enumerate_equation, deadline=deadline)
+        case "numpy":
+            from numpy_engine import enumerate_equation_numpy
+            enumerate_combos = enumerate_equation_numpy
+        case _:
+            raise ValueError(f"Unknown engine '{engine}'.")
+
+    def compute():
+        tables = mapped_tables(dimension)
+        if tables is not None and operations in tables:
+            return with_tiles(dimension, tables.combos(operations, target))
+        return with_tiles(
+            dimension, enumerate_combos(dimension, operations, target)
+        )
+
+    return EQUATION_CACHE.get((dimension, operations, target), compute)
+
+
+def equation_table(dimension: int, operations: str) -> MappingProxyType:
+    """
+    Evaluates the operations on every tuple of distinct numbers once and
+    buckets the tuples by their (integer) result. The tables are kept in
+    TABLE_CACHE (see its info() for the hits, misses and evictions).
+
+    :return: A read-only mapping target -> (combos, tiles), where the value
+        is exactly what equation_options returns for that target. Targets
+        with no combos are missing.
+    """
+    return TABLE_CACHE.get((dimension, operations),
+                           lambda: _bucket_table(dimension, operations))
+
+
+def _bucket_table(dimension: int, operations: str) -> MappingProxyType:
+    tables = mapped_tables(dimension)
+    if tables is not None and operations in tables:
+        return MappingProxyType({
+            target: with_tiles(dimension, combos)
+            for target, combos in tables.items(operations)
+        })
+    evaluate = compile_equation(operations).evaluate
+    buckets = {}
+    for combo in combinations(range(1, 1 + dimension ** 2), dimension):
+        for entries in permutations(combo):
+            result = evaluate(entries)
+            if result.denominator == 1:
+                buckets.setdefault(int(result), []).append(entries)
+    return MappingProxyType({target: with_tiles(dimension, combos)
+                             for target, combos in buckets.items()})
+
+
+class SquareLayout:
+    """
+    Everything about a Square that does not depend on its entries: the
+    equations, their compiled evaluators and the printing data, including
+    the rendering template with one {} per tile. Layouts are immutable and
+    shared between all Squares of the same puzzle (see square_layout).
+    """
+    __slots__ = ("dimension", "width", "source", "equations", "evaluators",
+                 "print_data", "number_strs", "template")
+
+    def __init__(self, dimension: int, operations_and_results: tuple[str]):
         self.dimension = dimension
-        self.width = ceil(2 * log10(self.dimension))
-        assert self.dimension * 2 == len(operations_and_results),\
+        self.source = operations_and_results
+        width = ceil(2 * log10(dimension))
+        assert dimension * 2 == len(operations_and_results),\
             "There needs to be twice as many equations as the dimension."
         # First how thick are the columns; we want all same-width.
-        minus = self.dimension - 1
+        minus = dimension - 1
         for row in operations_and_results:
             difference = len(row) - minus
-            if difference > self.width:
-                self.width = difference
-        self.print_data = []
-        self.equations = []
+            if difference > width:
+                width = difference
+        self.width = width
+        print_data = []
+        equations = []
         # Because there is one fewer operations than numbers in rows/columns.
         for row in operations_and_results:
-            offset_ops = [op.rjust(self.width) for op in row[:minus]]
-            result_str = row[minus:].rjust(self.width)
-            self.print_data.append((offset_ops, result_str, int(row[minus:])))
-            self.equations.append((row[:minus], int(row[minus:])))
+            offset_ops = tuple(op.rjust(width) for op in row[:minus])
+            result_str = row[minus:].rjust(width)
+            print_data.append((offset_ops, result_str, int(row[minus:])))
+            equations.append((row[:minus], int(row[minus:])))
             for operation in row[:minus]:
                 if operation not in "+-*/":
                     raise ValueError("Operation is not one of +-*/.")
-        # Now make lists for the numbers and their pretty-printing counterparts:
-        self.entries = [[0 for _ in range(dimension)] for _ in range(dimension)]
-        dim_sq = dimension * dimension + 1
-        self.number_strs = {n: str(n).rjust(self.width) for n in range(dim_sq)}
-        # print(self.number_strs)
+        self.print_data = tuple(print_data)
+        self.equations = tuple(equations)
+        # Each equation is compiled once, for all the checks to come:
+        self.evaluators = tuple(compile_equation(operations).evaluate
+                                for operations, _ in self.equations)
+        # The pretty-printing counterparts of the numbers, indexed by them:
+        self.number_strs = tuple(str(n).rjust(width)
+                                 for n in range(dimension * dimension + 1))
+        self.template = self._make_template()
 
-    def __str__(self):
-        split = "+" + ("-" * self.width + "+") * (2 * self.dimension + 1) + "\n"
-        xs = "X" * self.width
-        equals = " " * (self.width - 1) + "="
-        final = split
-        for row_index in range(2 * self.dimension - 1):
+    def _make_template(self) -> str:
+        """The printed square, with a {} wherever an entry goes."""
+        dimension, width = self.dimension, self.width
+        split = "+" + ("-" * width + "+") * (2 * dimension + 1) + "\n"
+        xs = "X" * width
+        equals = " " * (width - 1) + "="
+        parts = [split]
+        for row_index in range(2 * dimension - 1):
             quot, rem = divmod(row_index, 2)
             if rem:
-                for index in range(self.dimension, 2 * self.dimension):
-                    final += f"|{self.print_data[index][0][quot]}|"
-                    final += xs
-                final += f"|{xs}|\n"
+                for index in range(dimension, 2 * dimension):
+                    parts.append(f"|{self.print_data[index][0][quot]}|{xs}")
+                parts.append(f"|{xs}|\n")
             else:
-                for value, operation in zip(self.entries[quot],
-                                            self.print_data[quot][0]):
-                    final += f"|{self.number_strs[value]}|{operation}"
-                num_str = self.number_strs[self.entries[quot][-1]]
-                final += f"|{num_str}|{equals}|{self.print_data[quot][1]}|\n"
-            final += split
+                for operation in self.print_data[quot][0]:
+                    parts.append(f"|{{}}|{operation}")
+                parts.append(f"|{{}}|{equals}|{self.print_data[quot][1]}|\n")
+            parts.append(split)
         # Last few lines are different:
-        for _ in range(self.dimension):
-            final += f"|{equals}|{xs}"
-        final += f"|{xs}|\n{split}"
-        for index in range(self.dimension, 2 * self.dimension):
-            final += f"|{self.print_data[index][1]}|"
-            final += xs
-        final += f"|{xs}|\n{split}"
-        return final
+        parts.append(f"|{equals}|{xs}" * dimension)
+        parts.append(f"|{xs}|\n{split}")
+        for index in range(dimension, 2 * dimension):
+            parts.append(f"|{self.print_data[index][1]}|{xs}")
+        parts.append(f"|{xs}|\n{split}")
+        return "".join(parts)
+
+
+@lru_cache(maxsize=256)
+def square_layout(dimension: int,
+                  operations_and_results: tuple[str]) -> SquareLayout:
+    """The shared layout of the given puzzle."""
+    return SquareLayout(dimension, operations_and_results)
+
+
+def _rebuild_square(dimension: int, operations_and_results: tuple[str],
+                    entries: list[int]):
+    """Unpickles a Square (the compiled evaluators cannot be pickled)."""
+    square = Square(dimension, operations_and_results)
+    square.change_entries(entries)
+    return square
+
+
+class Square:
+    """
+    A puzzle (its SquareLayout, shared) together with its entries, stored
+    row by row in one flat array; 0 marks an empty tile.
+    """
+    __slots__ = ("layout", "cells")
+
+    def __init__(self, dimension: int, operations_and_results: list[str]):
+        self.layout = square_layout(dimension, tuple(operations_and_results))
+        dim_squared = dimension * dimension
+        self.cells = array("B" if dim_squared < 256 else "H",
+                           bytes(dim_squared) if dim_squared < 256
+                           else [0] * dim_squared)
+
+    @property
+    def dimension(self) -> int:
+        return self.layout.dimension
+
+    @property
+    def width(self) -> int:
+        return self.layout.width
+
+    @property
+    def equations(self) -> tuple[tuple[str, int]]:
+        return self.layout.equations
+
+    @property
+    def evaluators(self):
+        return self.layout.evaluators
+
+    @property
+    def print_data(self):
+        return self.layout.print_data
+
+    @property
+    def number_strs(self) -> tuple[str]:
+        return self.layout.number_strs
+
+    @property
+    def entries(self) -> tuple[tuple[int]]:
+        """The entries as a tuple of rows. They are a copy, hence read-only;
+        change_entries is what changes them."""
+        dimension = self.layout.dimension
+        return tuple(tuple(self.cells[start:start + dimension])
+                     for start in range(0, len(self.cells), dimension))
+
+    def clone(self):
+        """A copy of the square; only the entries get copied."""
+        duplicate = Square.__new__(Square)
+        duplicate.layout = self.layout
+        duplicate.cells = array(self.cells.typecode, self.cells)
+        return duplicate
+
+    __copy__ = clone
+
+    def __reduce__(self):
+        return _rebuild_square, (self.layout.dimension, self.layout.source,
+                                 self.cells.tolist())
+
+    def __str__(self):
+        number_strs = self.layout.number_strs
+        return self.layout.template.format(
+            *[number_strs[value] for value in self.cells]
+        )
 
     def check_row(self, index: int) -> bool:
         """
@@ -92,27 +400,15 @@ class Square:
         :return: Whether the equation evaluated
             in order matches the given target.
         """
-        assert index < self.dimension, "Row index too big!"
-        result = self.entries[index][0]
-        if not result:
-            # This entry is not filled in, so false.
+        dimension = self.layout.dimension
+        assert index < dimension, "Row index too big!"
+        row = self.cells[index * dimension:(index + 1) * dimension]
+        if not all(row):
+            # Some entry is not filled in, so false.
             return False
-        for op, num in zip(self.equations[index][0], self.entries[index][1:]):
-            if not num:
-                # This entry is not filled in, so false.
-                return False
-            match op:
-                case "+":
-                    result += num
-                case "-":
-                    result -= num
-                case "*":
-                    result *= num
-                case "/":
-                    result /= num
-                case _:
-                    raise(ValueError(f"{op} is not one of the four operations"))
-        return result == self.equations[index][1]  # Check if they match.
+        # Check if they match:
+        layout = self.layout
+        return layout.evaluators[index](row) == layout.equations[index][1]
 
     def check_column(self, index: int) -> bool:
         """
@@ -123,30 +419,17 @@ class Square:
         :return: Whether the equation evaluated
             in order matches the given target.
         """
-        assert index < self.dimension, "Column index too big!"
-        result = self.entries[0][index]
-        if not result:
-            # This entry is not filled in, so false.
+        dimension = self.layout.dimension
+        assert index < dimension, "Column index too big!"
+        column = self.cells[index::dimension]
+        if not all(column):
+            # Some entry is not filled in, so false.
             return False
-        eq_index = self.dimension + index
-        for row_index in range(1, self.dimension):
-            number = self.entries[row_index][index]
-            if not number:
-                # This entry is not filled in, so false.
-                return False
-            op = self.equations[eq_index][0][row_index - 1]
-            match op:
-                case "+":
-                    result += number
-                case "-":
-                    result -= number
-                case "*":
-                    result *= number
-                case "/":
-                    result /= number
-                case _:
-                    raise(ValueError(f"'{op}' is not in the four operations"))
-        return result == self.equations[eq_index][1]  # Check if they match.
+        eq_index = dimension + index
+        # Check if they match:
+        layout = self.layout
+        return layout.evaluators[eq_index](column) ==\
+            layout.equations[eq_index][1]
 
     def are_all_constraints_satisfied(self) -> bool:
         """Checks if all rows and columns obey the equations."""
@@ -162,13 +445,9 @@ class Square:
         :param new_entries: New entries.
         :return: None
         """
-        assert len(new_entries) == self.dimension ** 2,\
+        assert len(new_entries) == len(self.cells),\
             "Incorrect number of entries"
-        increasing = 0
-        for row_index in range(self.dimension):
-            for column_index in range(self.dimension):
-                self.entries[row_index][column_index] = new_entries[increasing]
-                increasing += 1
+        self.cells[:] = array(self.cells.typecode, new_entries)
 
     def single_entry_change(self, position: int, value: int):
         """
@@ -178,47 +457,74 @@ class Square:
         :param value: The new value.
         :return: None
         """
-        assert 0 <= position < self.dimension ** 2, "Position index is too big!"
-        assert 0 <= value <= self.dimension ** 2, "Number value is too big!"
-        quotient, remainder = divmod(position, self.dimension)
-        self.entries[quotient][remainder] = value
+        assert 0 <= position < len(self.cells), "Position index is too big!"
+        assert 0 <= value <= len(self.cells), "Number value is too big!"
+        self.cells[position] = value
+
+    def copy_with_entries(self, new_entries: list[int] | tuple[int]):
+        """
+        A copy of the square with the given entries. The equations and the
+        printing data never change, so they are shared with the original.
+
+        :param new_entries: All entries, row by row.
+        :return: The new Square.
+        """
+        duplicate = self.clone()
+        duplicate.change_entries(new_entries)
+        return duplicate
 
-    def equation_possibilities(self, index):
+    def equation_possibilities(self, index, engine: str = "python",
+                               deadline: float | None = None):
         """Returns all possible combinations that index-given equation has.
         Also returns a list of sets that signify what numbers are at least once
-        at the given position."""
+        at the given position.
+        Both are shared through EQUATION_CACHE, hence tuples and frozensets.
+        The engine is either "python" or "numpy" (see numpy_engine)."""
         operations, target = self.equations[index]
-        used_numbers = range(1, 1 + self.dimension ** 2)
-        possible_combinations = []
-        for combo in combinations(used_numbers, self.dimension):
-            for eq_entries in permutations(combo):
-                computed_result = eq_entries[0]
-                for operation, number in zip(operations, eq_entries[1:]):
-                    match operation:
-                        case "+":
-                            computed_result += number
-                        case "-":
-                            computed_result -= number
-                        case "*":
-                            computed_result *= number
-                        case "/":
-                            computed_result /= number
-                        case _:
-                            raise (ValueError(f"{operation} is not one of"
-                                              f"the four operations"))
-                if computed_result == target:
-                    possible_combinations.append(eq_entries)
-        tile_possibilities = [set() for _ in range(self.dimension)]
-        for entries in possible_combinations:
-            for index in range(self.dimension):
-                tile_possibilities[index].add(entries[index])
-        return possible_combinations, tile_possibilities
-
-    def options_in_all_equations(self):
-        """Returns the possibilities and tile-sets of ALL equations."""
+        return equation_options(self.dimension, operations, target, engine,
+                                deadline)
+
+    def options_in_all_equations(self, engine: str = "python",
+                                 deadline: float | None = None):
+        """Returns the possibilities and tile-sets of ALL equations.
+        With engine="numpy", every distinct operation string that is neither
+        cached yet nor in the table file gets evaluated in a single bulk pass
+        for all its targets.
+        Past the deadline (a time.monotonic() value), BudgetExceeded is
+        raised: within an equation by the python engine, otherwise between
+        the equations (or operation strings)."""
+        if engine == "numpy":
+            from numpy_engine import bucket_targets
+            tables = mapped_tables(self.dimension)
+            missing = {}
+            for operations, target in self.equations:
+                if (self.dimension, operations, target) in EQUATION_CACHE or\
+                        tables is not None and operations in tables:
+                    continue
+                missing.setdefault(operations, set()).add(target)
+            computed = {}
+            for operations, targets in missing.items():
+                check_deadline(deadline)
+                buckets = bucket_targets(self.dimension, operations, targets)
+                for target, combos in buckets.items():
+                    computed[operations, target] = combos
+            option_list = []
+            for operations, target in self.equations:
+                if (operations, target) not in computed:
+                    option_list.append(equation_options(
+                        self.dimension, operations, target))
+                    continue
+                option_list.append(EQUATION_CACHE.get(
+                    (self.dimension, operations, target),
+                    lambda key=(operations, target):
+                        with_tiles(self.dimension, computed[key])
+                ))
+            return option_list
         option_list = []
         for index in range(2 * self.dimension):
-            option_list.append(self.equation_possibilities(index))
+            check_deadline(deadline)
+            option_list.append(self.equation_possibilities(index, engine,
+                                                           deadline))
         return option_list
 
 
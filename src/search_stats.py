@@ -0,0 +1,111 @@
+"""
+Statistics of one run of the solver pipeline, for finding out whether the
+setup, the propagation or the branching is what makes a square slow.
+
+Pass a SearchStats to possibility_collapse (or iter_solutions) and read it
+afterwards. The hooks let you attach your own tracing:
+    on_node(depth, eq, combo, consistent) - after each combo is tried,
+    on_solution(entries) - for each solution, as it is found.
+With workers, the subtrees solved in other processes only add to the
+counters; on_node does not fire for them.
+
+A SearchStats can also be a budget: with max_nodes or deadline (a
+time.monotonic() value, which all processes of the machine share), the
+search raises BudgetExceeded at the first node beyond either. The deadline
+also covers the setup and the propagation, which check it as they go (see
+check_deadline); like the hooks, the budget only covers this process.
+"""
+
+
+from time import monotonic
+
+
+class BudgetExceeded(Exception):
+    """The search ran out of nodes or time; reason is "nodes" or "time"."""
+    def __init__(self, reason: str):
+        super().__init__(f"Search budget exceeded ({reason}).")
+        self.reason = reason
+
+
+def check_deadline(deadline: float | None):
+    """Raises BudgetExceeded("time") once the deadline (None: none) passed."""
+    if deadline is not None and monotonic() > deadline:
+        raise BudgetExceeded("time")
+
+
+class SearchStats:
+    def __init__(self, on_node=None, on_solution=None,
+                 max_nodes: int | None = None, deadline: float | None = None):
+        self.on_node = on_node
+        self.on_solution = on_solution
+        self.max_nodes = max_nodes
+        self.deadline = deadline
+        # Timings, in seconds:
+        self.setup_seconds = 0.0  # options_in_all_equations.
+        self.search_seconds = 0.0  # rows_recursively, propagation included.
+        self.propagation_seconds = 0.0  # All iterative_deletion calls.
+        self.slowest_propagation = 0.0  # The longest single call.
+        self.propagation_calls = 0
+        # Counters:
+        self.combos_generated = []  # Per equation.
+        self.combos_pruned = 0
+        self.pruned_per_round = []  # Per iterative_deletion call...
+        self.seconds_per_round = []  # ... and its time, in the same order.
+        self.nodes = 0  # Combos tried by the search.
+        self.dead_ends = 0  # ... which turned out to be inconsistent.
+        self.max_depth = 0
+        self.solutions = 0
+
+    def propagation(self, seconds: float, pruned: int):
+        """Records one iterative_deletion call."""
+        self.propagation_calls += 1
+        self.propagation_seconds += seconds
+        self.slowest_propagation = max(self.slowest_propagation, seconds)
+        self.combos_pruned += pruned
+        self.pruned_per_round.append(pruned)
+        self.seconds_per_round.append(seconds)
+
+    def node(self, depth: int, eq: int, combo: tuple[int], consistent: bool):
+        """Records that the search tried the combo at the given depth."""
+        self.nodes += 1
+        self.max_depth = max(self.max_depth, depth)
+        if not consistent:
+            self.dead_ends += 1
+        if self.on_node is not None:
+            self.on_node(depth, eq, combo, consistent)
+        if self.max_nodes is not None and self.nodes > self.max_nodes:
+            raise BudgetExceeded("nodes")
+        check_deadline(self.deadline)
+
+    def solution(self, entries: tuple[int]):
+        """Records a solution found by the search."""
+        self.solutions += 1
+        if self.on_solution is not None:
+            self.on_solution(entries)
+
+    def merge(self, other):
+        """Adds the search counters of other (e.g. from a worker) to these."""
+        self.propagation_seconds += other.propagation_seconds
+        self.slowest_propagation = max(self.slowest_propagation,
+                                       other.slowest_propagation)
+        self.propagation_calls += other.propagation_calls
+        self.combos_pruned += other.combos_pruned
+        self.pruned_per_round.extend(other.pruned_per_round)
+        self.seconds_per_round.extend(other.seconds_per_round)
+        self.nodes += other.nodes
+        self.dead_ends += other.dead_ends
+        self.max_depth = max(self.max_depth, other.max_depth)
+
+    def as_dict(self) -> dict:
+        """The numbers (not the hooks or the budget), e.g. for json.dumps."""
+        return {key: value for key, value in vars(self).items()
+                if not key.startswith("on_")
+                and key not in ("max_nodes", "deadline")}
+
+    def __repr__(self):
+        return (f"SearchStats(setup={self.setup_seconds:.6f}s, "
+                f"search={self.search_seconds:.6f}s, "
+                f"propagation={self.propagation_seconds:.6f}s "
+                f"in {self.propagation_calls} calls, nodes={self.nodes}, "
+                f"dead_ends={self.dead_ends}, max_depth={self.max_depth}, "
+                f"solutions={self.solutions})")
@@ -0,0 +1,270 @@
+"""
+A local solver service: squares come in over TCP (or a Unix socket) as JSON
+lines, get solved on a process pool, and the results go back as JSON lines.
+
+A request is
+    {"id": 7, "size": 3, "equations": ["+-6", ...],
+     "max_solutions": 10, "max_nodes": 50000, "timeout": 2.5}
+where id is anything to match the response with (responses come back as
+soon as they are ready, not in order) and the three limits are optional:
+they can lower the limits the service was started with, not raise them.
+A response has the fields of a batch.py result, with id instead of line:
+    id, size, equations, status, solution_count, complete, solutions,
+    stopped (if not complete), error (if status is "error"), seconds.
+When a limit stops the search, complete is false and solution_count says
+how many solutions were found at least. {"cancel": 7} stops request 7 of
+the same connection, which is answered with status "cancelled".
+
+The node and time limits are checked by the search itself (see
+SearchStats), the time limit also while the options of the equations are
+enumerated and propagated, so a worker stops on its own soon after it and
+sends back what it found. The time limit counts from the arrival of the
+request; if a worker is still not back shortly after it, the request is
+answered without any solutions.
+
+Identical requests that arrive while one of them is being solved share its
+result. A job nobody waits for anymore is taken off the pool queue.
+"""
+
+
+import asyncio
+import json
+import sys
+from argparse import ArgumentParser
+from concurrent.futures import ProcessPoolExecutor
+from time import monotonic, perf_counter
+from batch import solve_grid
+
+
+DEFAULT_PORT = 8765
+
+
+def _capped(requested, cap):
+    """The stricter of a requested limit and the service's (None: none)."""
+    if requested is None:
+        return cap
+    if cap is None:
+        return requested
+    return min(requested, cap)
+
+
+def _limit(request: dict, key: str, kind):
+    """A positive limit of the request, or None if it has none."""
+    value = request.get(key)
+    if value is None:
+        return None
+    value = kind(value)
+    if value <= 0:
+        raise ValueError(f"{key} has to be positive.")
+    return value
+
+
+def _out_of_time() -> dict:
+    return dict(status="unknown", solution_count=0, complete=False,
+                solutions=[], stopped="time")
+
+
+def solve_job(size: int, equations: list[str], max_solutions: int | None,
+              max_nodes: int | None, deadline: float) -> dict:
+    """Runs in the workers: solve_grid, unless the deadline passed while
+    the job was waiting in the queue."""
+    if monotonic() > deadline:
+        return _out_of_time()
+    return solve_grid(size, equations, max_solutions, max_nodes, deadline)
+
+
+class SolverService:
+    def __init__(self, workers: int | None = None, timeout: float = 10.0,
+                 max_nodes: int | None = None, max_solutions: int = 1000,
+                 grace: float = 1.0):
+        """
+        :param workers: Size of the process pool (None: one per CPU).
+        :param timeout: Longest time a request may take, in seconds.
+        :param max_nodes: Most search nodes a request may take (None: any).
+        :param max_solutions: Most solutions a response may hold.
+        :param grace: How long to wait for a worker past the time limit.
+        """
+        assert timeout > 0, "The timeout has to be positive."
+        self.timeout = timeout
+        self.max_nodes = max_nodes
+        self.max_solutions = max_solutions
+        self.grace = grace
+        self.executor = ProcessPoolExecutor(max_workers=workers)
+        # Key of a request -> [future of its job, number of waiters]:
+        self.in_flight = {}
+
+    async def solve(self, size: int, equations: list[str],
+                    max_solutions: int | None = None,
+                    max_nodes: int | None = None,
+                    timeout: float | None = None) -> dict:
+        """Solves the square on the pool within the limits (capped by the
+        service's), sharing the job of an identical request in flight."""
+        max_solutions = _capped(max_solutions, self.max_solutions)
+        max_nodes = _capped(max_nodes, self.max_nodes)
+        timeout = _capped(timeout, self.timeout)
+        key = (size, tuple(equations), max_solutions, max_nodes, timeout)
+        if key not in self.in_flight:
+            job = asyncio.wrap_future(self.executor.submit(
+                solve_job, size, equations, max_solutions, max_nodes,
+                monotonic() + timeout
+            ))
+            self.in_flight[key] = [job, 0]
+            job.add_done_callback(lambda _: self.in_flight.pop(key, None))
+        entry = self.in_flight[key]
+        job = entry[0]
+        entry[1] += 1
+        try:
+            # Shielded, so that one waiter giving up leaves it to the others:
+            return await asyncio.wait_for(asyncio.shield(job),
+                                          timeout + self.grace)
+        except asyncio.TimeoutError:
+            return _out_of_time()
+        finally:
+            entry[1] -= 1
+            if not entry[1] and not job.done():
+                # Nobody waits anymore: drop it if it has not started yet.
+                job.cancel()
+
+    async def _answer(self, request: dict, writer, lock: asyncio.Lock,
+                      tasks: dict, key: str):
+        """Solves one request and writes its response. It can be cancelled
+        (through tasks[key]) until the response is ready."""
+        response = {"id": request.get("id")}
+        start = perf_counter()
+        try:
+            size = int(request["size"])
+            equations = [str(equation) for equation in request["equations"]]
+            response.update(size=size, equations=equations)
+            response.update(await self.solve(
+                size, equations, _limit(request, "max_solutions", int),
+                _limit(request, "max_nodes", int),
+                _limit(request, "timeout", float)
+            ))
+        except asyncio.CancelledError:
+            response.update(status="cancelled", solution_count=0,
+                            complete=False, solutions=[])
+        except Exception as error:
+            response.update(status="error", solution_count=0, complete=True,
+                            solutions=[], error=repr(error))
+        response["seconds"] = round(perf_counter() - start, 6)
+        self._forget(tasks, key, asyncio.current_task())
+        async with lock:
+            try:
+                writer.write((json.dumps(response) + "\n").encode())
+                await writer.drain()
+            except ConnectionError:
+                pass  # The client is gone; nothing to tell it.
+
+    async def handle_connection(self, reader, writer):
+        """Answers the requests of one connection until it closes; the
+        ones still being solved then are answered first, if possible."""
+        lock = asyncio.Lock()
+        tasks = {}  # id (as JSON, so any id will do) -> task being solved.
+        answering = set()  # All the tasks, also those writing a response.
+        try:
+            while line := await reader.readline():
+                if not line.strip():
+                    continue
+                try:
+                    request = json.loads(line)
+                    if not isinstance(request, dict):
+                        raise ValueError("A request has to be an object.")
+                except ValueError as error:
+                    await self._answer_invalid(error, writer, lock)
+                    continue
+                if "cancel" in request:
+                    task = tasks.get(json.dumps(request["cancel"]))
+                    if task is not None:
+                        task.cancel()
+                    continue
+                key = json.dumps(request.get("id"))
+                tasks[key] = asyncio.create_task(
+                    self._answer(request, writer, lock, tasks, key))
+                answering.add(tasks[key])
+                tasks[key].add_done_callback(answering.discard)
+                # Lets it start, so that a cancel finds it answering:
+                await asyncio.sleep(0)
+            if answering:
+                await asyncio.gather(*answering, return_exceptions=True)
+        finally:
+            for task in answering:
+                task.cancel()
+            writer.close()
+
+    @staticmethod
+    def _forget(tasks: dict, key: str, task: asyncio.Task):
+        """Drops the task of a request, unless its id was reused meanwhile."""
+        if tasks.get(key) is task:
+            del tasks[key]
+
+    async def _answer_invalid(self, error: Exception, writer, lock):
+        response = dict(id=None, status="error", solution_count=0,
+                        complete=True, solutions=[], error=repr(error),
+                        seconds=0.0)
+        async with lock:
+            writer.write((json.dumps(response) + "\n").encode())
+            await writer.drain()
+
+    async def serve(self, host: str = "127.0.0.1", port: int = DEFAULT_PORT,
+                    path: str | None = None):
+        """Serves forever on host:port, or on the Unix socket path."""
+        if path is not None:
+            server = await asyncio.start_unix_server(self.handle_connection,
+                                                     path)
+        else:
+            server = await asyncio.start_server(self.handle_connection,
+                                                host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self):
+        """Stops the pool, dropping the jobs that have not started."""
+        self.executor.shutdown(wait=False, cancel_futures=True)
+
+
+async def solve_remote(request: dict, host: str = "127.0.0.1",
+                       port: int = DEFAULT_PORT,
+                       path: str | None = None) -> dict:
+    """Sends one request to a running service and returns its response."""
+    if path is not None:
+        reader, writer = await asyncio.open_unix_connection(path)
+    else:
+        reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + "\n").encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+        await writer.wait_closed()
+
+
+def parse_arguments():
+    parser = ArgumentParser(description="Serves the solver of arithmetic "
+                                        "squares as JSON lines over TCP.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--unix", metavar="PATH", default=None,
+                        help="serve on this Unix socket instead of TCP")
+    parser.add_argument("--workers", type=int, default=None,
+                        help="size of the process pool")
+    parser.add_argument("--timeout", type=float, default=10.0,
+                        help="longest time a request may take, in seconds")
+    parser.add_argument("--max-nodes", type=int, default=None,
+                        help="most search nodes a request may take")
+    parser.add_argument("--max-solutions", type=int, default=1000,
+                        help="most solutions a response may hold")
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    arguments = parse_arguments()
+    service = SolverService(arguments.workers, arguments.timeout,
+                            arguments.max_nodes, arguments.max_solutions)
+    try:
+        asyncio.run(service.serve(arguments.host, arguments.port,
+                                  arguments.unix))
+    except KeyboardInterrupt:
+        print("Stopped.", file=sys.stderr)
+    finally:
+        service.close()
@@ -1,6 +1,12 @@
-from puzzle_class import Square
-from copy import deepcopy
-from itertools import permutations
+from dlx import dlx_solutions
+from puzzle_class import Square, equation_table
+from search_stats import SearchStats, check_deadline
+import warnings
+from collections import deque, namedtuple
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from functools import lru_cache
+from itertools import compress, islice, permutations
+from time import perf_counter
 
 
 def permutation_bruteforce(grid: Square) -> Square:
@@ -42,144 +48,609 @@ def primitive_row_recursion(
     return None
 
 
-def is_combo_doable(
-    the_combo: list[int], positions, possible: list[set[int]]
-) -> bool:
-    """
-    Helper method of iterative_deletion; checks if all tiles in the_combo
-    have a value which is listed as possible in the tile.
+def to_bitmask(numbers) -> int:
+    """Packs a collection of numbers into an int with those bits set."""
+    mask = 0
+    for number in numbers:
+        mask |= 1 << number
+    return mask
 
-    :param the_combo: Asked for entries of the row/column
-    :param positions: the positions on which this combination belongs
-    :param possible: tile possibilities
-    :return: "all entries in the_combo are possible in their tiles" (True/False)
-    """
-    for index, value in enumerate(the_combo):
-        if value not in possible[positions[index]]:
-            return False
-    return True
 
+def from_bitmask(mask: int) -> list[int]:
+    """The numbers whose bits are set in mask, in increasing order."""
+    numbers = []
+    while mask:
+        lowest = mask & -mask
+        numbers.append(lowest.bit_length() - 1)
+        mask ^= lowest
+    return numbers
 
-def iterative_deletion(dimension: int, tile_possible: list[set[int]],
-                       available_combos: list[list[tuple[int]]]):
-    """Iteratively deletes possibilities.
-    First, it prunes all combos that are not doable (see above).
-    Then, based on that, it removes some tile entries, which are no longer
-    achievable through any combination.
-    This is repeated until no change is made.
-    """
+
+def is_singleton(mask: int) -> bool:
+    """Whether exactly one number is possible in the tile."""
+    return mask != 0 and not mask & (mask - 1)
+
+
+def pack_combos(dimension: int, combos) -> list[bytes]:
+    """Packs the combos of one equation column-wise: the k-th bytes object
+    holds the k-th entry of every combo, so combo i is read off at index i
+    of each of them."""
+    assert dimension * dimension < 256, "The numbers have to fit in a byte."
+    return [bytes(combo[k] for combo in combos) for k in range(dimension)]
+
+
+def unpack_combos(packed: list[bytes]):
+    """Iterates over the combos of pack_combos as tuples again."""
+    return zip(*packed)
+
+
+def equation_tiles(dimension: int) -> list[tuple[int]]:
+    """Tile indices of every row equation and then every column equation."""
     dim_squared = dimension * dimension
-    # First some index pre-work:
     eq_indices = []
     for i in range(dimension):
         eq_indices.append(tuple(range(i*dimension, (i+1)*dimension)))
     for i in range(dimension, 2 * dimension):
         eq_indices.append(tuple(range(i-dimension, dim_squared, dimension)))
-    # Now we iteratively eliminate possible combos:
-    previous_combos = available_combos[:]
-    change_was_made = True
-    while change_was_made:
-        combos_tiles_together = []
-        change_was_made = False
-        # print(tile_possible)
-        # print(previous_combos)
-        for i, equation in enumerate(previous_combos):
-            eq_combos = []
-            eq_possible = [set() for _ in range(dimension)]
-            # print(i, equation)
-            for combo in equation:
-                if is_combo_doable(combo, eq_indices[i], tile_possible):
-                    eq_combos.append(combo)
-                    for index in range(dimension):
-                        eq_possible[index].add(combo[index])
-            combos_tiles_together.append((eq_combos, eq_possible))
-        for index in range(dim_squared):
-            q, r = divmod(index, dimension)
-            row_possible: set[int] = combos_tiles_together[q][1][r]
-            col_possible: set[int] = combos_tiles_together[dimension + r][1][q]
-            r_c_intersection: set[int] = row_possible.intersection(col_possible)
-            if r_c_intersection != tile_possible[index]:
-                change_was_made = True
-            tile_possible[index] = r_c_intersection
-        previous_combos = [combos_tiles_together[i][0] for i in
-                           range(2 * dimension)]
-        if not all(tile_possible):  # Some tile has no possibilities!
-            return [], []
-    return previous_combos, tile_possible
-
-
-def rows_recursively(dim: int, depth: int,
-                     combos: list[list[tuple[int]]], grid_possibilities):
+    return eq_indices
+
+
+@lru_cache(maxsize=4096)
+def flag_table(mask: int) -> bytes:
+    """A bytes.translate table mapping each number to 1 if it is in mask."""
+    table = bytearray(256)
+    for number in from_bitmask(mask):
+        table[number] = 1
+    return bytes(table)
+
+
+class PropagationState:
+    """
+    Everything the search knows about a partially solved square.
+
+    Every tile has a bitmask of its possible numbers. Every equation keeps
+    its still doable combos packed (see pack_combos) together with support
+    masks: per position, the numbers that some of those combos use.
+    When a tile loses numbers, only the two equations crossing it are queued,
+    and they only re-check their combos at the positions of changed tiles.
+    A tile in turn only changes when the support of one of its equations
+    shrinks, so stable parts of the square cost nothing.
+
+    Besides the equations, the state enforces that all tiles take different
+    numbers (all_different), which iterative_deletion runs alongside.
+
+    The search shares one state: every change is recorded on a trail as
+    (container, index, old value), and undo(mark) rolls back to a mark.
+    """
+    def __init__(self, dimension: int, combos: list[list[bytes]]):
+        self.dimension = dimension
+        dim_squared = dimension * dimension
+        # Static data, shared between copies:
+        self.eq_tiles = equation_tiles(dimension)
+        self.tile_eqs = [[] for _ in range(dim_squared)]
+        for eq, tiles in enumerate(self.eq_tiles):
+            for position, tile in enumerate(tiles):
+                self.tile_eqs[tile].append((eq, position))
+        # Dynamic data:
+        self.domains = [to_bitmask(range(1, dim_squared + 1))] * dim_squared
+        self.columns = combos[:]
+        self.support = [[to_bitmask(set(column)) for column in columns]
+                        for columns in combos]
+        # Worklist of equations crossing a changed tile, together with
+        # (as a bitmask) the positions at which their tiles changed:
+        self.queue = deque()
+        self.dirty = [0] * len(combos)
+        self.trail = []
+        self.stats = None  # A SearchStats, if the search is being measured.
+        # A matching of tiles to distinct numbers (see all_different). It is
+        # only a starting point for the next call, so it is not trailed:
+        self.matched = [0] * dim_squared  # Tile -> number, 0 if none.
+        self.owner = [-1] * (dim_squared + 1)  # Number -> tile, -1 if none.
+        for tile, ((row, r_pos), (column, c_pos)) in enumerate(self.tile_eqs):
+            self.restrict(tile, self.support[row][r_pos] &
+                          self.support[column][c_pos])
+
+    def mark(self) -> int:
+        """A point of the trail that undo can later return to."""
+        return len(self.trail)
+
+    def undo(self, mark: int):
+        """Reverts every change made since the mark was taken."""
+        trail = self.trail
+        while len(trail) > mark:
+            container, index, old = trail.pop()
+            container[index] = old
+        self.queue.clear()
+        self.dirty = [0] * len(self.dirty)
+
+    def snapshot(self) -> tuple[int]:
+        """The entries of a fully collapsed square, as plain numbers."""
+        return tuple(mask.bit_length() - 1 for mask in self.domains)
+
+    def restrict(self, tile: int, mask: int, source: int = -1) -> bool:
+        """
+        Keeps only the numbers of mask in the tile, queueing the equations
+        crossing it (except source) if anything was removed.
+
+        :return: False if the tile has no possibilities left.
+        """
+        old = self.domains[tile]
+        new = old & mask
+        if new != old:
+            self.trail.append((self.domains, tile, old))
+            self.domains[tile] = new
+            for eq, position in self.tile_eqs[tile]:
+                if eq == source:
+                    continue
+                if not self.dirty[eq]:
+                    self.queue.append(eq)
+                self.dirty[eq] |= 1 << position
+        return bool(new)
+
+    def is_filled(self, eq: int) -> bool:
+        """Whether every tile of the equation has a single number left."""
+        return all(is_singleton(self.domains[tile])
+                   for tile in self.eq_tiles[eq])
+
+    def combo_count(self, eq: int) -> int:
+        """The number of combos of the equation that are still doable."""
+        return len(self.columns[eq][0])
+
+    def combos_of(self, eq: int):
+        """The still doable combos of the equation, as tuples."""
+        return unpack_combos(self.columns[eq])
+
+    def revise(self, eq: int) -> bool:
+        """
+        Drops the combos of the equation that use a number no longer possible
+        in one of its changed tiles, then shrinks the tiles whose support
+        dropped.
+
+        :return: False if some tile ran out of possibilities.
+        """
+        columns = self.columns[eq]
+        tiles = self.eq_tiles[eq]
+        flags = -1
+        dirty = self.dirty[eq]
+        self.dirty[eq] = 0
+        for position in from_bitmask(dirty):
+            table = flag_table(self.domains[tiles[position]])
+            flags &= int.from_bytes(columns[position].translate(table), "big")
+        selector = flags.to_bytes(len(columns[0]), "big")
+        if not selector.count(0):
+            return True
+        # Keep only the doable combos, so later revisions look at fewer:
+        self.trail.append((self.columns, eq, columns))
+        columns = [bytes(compress(column, selector)) for column in columns]
+        self.columns[eq] = columns
+        support = self.support[eq]
+        for position, column in enumerate(columns):
+            supported = to_bitmask(set(column))
+            if supported != support[position]:
+                self.trail.append((support, position, support[position]))
+                support[position] = supported
+                if not self.restrict(tiles[position], supported, eq):
+                    return False
+        return True
+
+    def _augment(self, tile: int, seen: list[bool]) -> bool:
+        """Finds a number for the tile, moving other tiles to other numbers
+        along an alternating path if needed (Kuhn's algorithm)."""
+        numbers = from_bitmask(self.domains[tile])
+        owner = self.owner
+        for number in numbers:
+            if owner[number] < 0:
+                self.matched[tile] = number
+                owner[number] = tile
+                return True
+        for number in numbers:
+            other = owner[number]
+            if not seen[other]:
+                seen[other] = True
+                if self._augment(other, seen):
+                    self.matched[tile] = number
+                    owner[number] = tile
+                    return True
+        return False
+
+    def all_different(self) -> bool:
+        """
+        Keeps only the numbers that some assignment of distinct numbers to
+        all the tiles uses (Régin's filtering).
+
+        Every tile is first matched to a different number. There are as many
+        numbers as tiles, so a tile may also take the number of another tile
+        exactly when the two lie on a cycle of "tile -> tile matched to one
+        of its other numbers" arcs, i.e. in the same strongly connected
+        component. The numbers outside a tile's component are removed; this
+        covers every Hall set (k tiles sharing only k numbers) at once.
+        As a side effect, tiles left with a single number always hold
+        different ones; the leaves of the search still check this anyway
+        (uses_all_numbers), so that they stay correct on states that have
+        not been through all_different.
+
+        :return: False if the tiles cannot all get different numbers.
+        """
+        domains = self.domains
+        matched, owner = self.matched, self.owner
+        size = len(domains)
+        for tile, number in enumerate(matched):
+            if number and not domains[tile] >> number & 1:
+                matched[tile] = 0
+                owner[number] = -1
+        for tile in range(size):
+            if not matched[tile] and not self._augment(tile, [False] * size):
+                # Pigeonhole: some tiles share too few numbers.
+                return False
+        # Tarjan's algorithm on the tiles, iteratively:
+        arcs = [[owner[number] for number in from_bitmask(
+            domains[tile] & ~(1 << matched[tile]))] for tile in range(size)]
+        index = [-1] * size
+        low = [0] * size
+        on_stack = [False] * size
+        stack = []
+        component_numbers = [0] * size  # Tile -> numbers of its component.
+        counter = 0
+        for root in range(size):
+            if index[root] >= 0:
+                continue
+            work = [(root, 0)]
+            while work:
+                tile, position = work.pop()
+                if not position:
+                    index[tile] = low[tile] = counter
+                    counter += 1
+                    stack.append(tile)
+                    on_stack[tile] = True
+                for position in range(position, len(arcs[tile])):
+                    other = arcs[tile][position]
+                    if index[other] < 0:
+                        work.append((tile, position + 1))
+                        work.append((other, 0))
+                        break
+                    if on_stack[other]:
+                        low[tile] = min(low[tile], index[other])
+                else:
+                    if low[tile] == index[tile]:
+                        component = []
+                        while True:
+                            member = stack.pop()
+                            on_stack[member] = False
+                            component.append(member)
+                            if member == tile:
+                                break
+                        numbers = 0
+                        for member in component:
+                            numbers |= 1 << matched[member]
+                        for member in component:
+                            component_numbers[member] = numbers
+                    if work:
+                        parent = work[-1][0]
+                        low[parent] = min(low[parent], low[tile])
+        for tile in range(size):
+            # Always keeps the matched number, so this never empties a tile.
+            self.restrict(tile, component_numbers[tile])
+        return True
+
+    def propagate(self) -> bool:
+        """
+        Revises queued equations until nothing changes anymore.
+
+        :return: False if some tile ran out of possibilities.
+        """
+        queue = self.queue
+        while queue:
+            if not self.revise(queue.popleft()):
+                queue.clear()
+                self.dirty = [0] * len(self.dirty)
+                return False
+        return True
+
+
+def iterative_deletion(state: PropagationState) -> bool:
+    """Iteratively deletes possibilities.
+    Removing a number from a tile prunes the combos that are no longer doable
+    in the two equations crossing it. Then, based on that, it removes the tile
+    entries which are no longer achievable through any combination.
+    This is repeated (through the worklist of the state) until no change is
+    made, so only equations crossing a changed tile are ever revisited.
+    In between, the numbers that cannot go with all tiles taking different
+    numbers are removed as well (see PropagationState.all_different).
+
+    :return: False if some tile has no possibilities left.
+    """
+    stats = state.stats
+    if stats is None:
+        return all(state.domains) and _propagate_all(state)
+    equations = range(len(state.columns))
+    before = sum(map(state.combo_count, equations))
+    start = perf_counter()
+    consistent = all(state.domains) and _propagate_all(state)
+    stats.propagation(perf_counter() - start,
+                      before - sum(map(state.combo_count, equations)))
+    return consistent
+
+
+def _propagate_all(state: PropagationState) -> bool:
+    """Alternates the equations' propagation with the all-different
+    filtering until neither removes anything. The deadline of the stats
+    of the state, if any, is checked after each round."""
+    while state.propagate():
+        if state.stats is not None:
+            check_deadline(state.stats.deadline)
+        if not state.all_different():
+            return False
+        if not state.queue:
+            return True
+    return False
+
+
+def row_order(state: PropagationState) -> int | None:
+    """Branching policy: the topmost row that is not filled in yet, i.e. the
+    original top-to-bottom order. None once all rows are filled in."""
+    for eq in range(state.dimension):
+        if not state.is_filled(eq):
+            return eq
+    return None
+
+
+def fewest_combos(state: PropagationState) -> int | None:
+    """Branching policy (fail-first): the row or column that is not filled in
+    yet and has the fewest combos left. None once everything is filled in."""
+    best, best_count = None, None
+    for eq in range(2 * state.dimension):
+        if state.is_filled(eq):
+            continue
+        count = state.combo_count(eq)
+        if best_count is None or count < best_count:
+            best, best_count = eq, count
+    return best
+
+
+def rows_recursively(state: PropagationState, depth: int = 0,
+                     branching=fewest_combos):
     """Given an ensemble of possible combos, the function recursively fills in
-    all rows.
+    all rows and columns. Solutions are yielded as tuples of the entries.
 
-    After fixing each row, the grid_possibilities are changed to
+    At each step, the branching policy picks which equation to fill in next;
+    row_order goes through the rows top-to-bottom, fewest_combos (default)
+    picks the row or column with the fewest combos left.
+
+    After fixing each equation, the tile possibilities are changed to
     reflect this change (those positions are fixed to {number}, and this number
-    is removed from all other tiles).
+    is removed from all other tiles). The state is shared by the whole
+    search, so each branch undoes its changes before the next one.
+    """
+    eq = branching(state)
+    if eq is None:
+        # Bottom of generators. all_different keeps the single numbers left
+        # by the propagation distinct, but the leaf does not rely on it:
+        if uses_all_numbers(state):
+            yield state.snapshot()
+        return
+    stats = state.stats
+    for new_combo in state.combos_of(eq):
+        mark = state.mark()
+        consistent = fix_combo(state, eq, new_combo)
+        if stats is not None:
+            stats.node(depth + 1, eq, new_combo, consistent)
+        if consistent:
+            if all(map(is_singleton, state.domains)):
+                # Already we have a single digit everywhere.
+                if uses_all_numbers(state):
+                    yield state.snapshot()
+                elif stats is not None:
+                    stats.dead_ends += 1
+            else:
+                yield from rows_recursively(state, depth + 1, branching)
+        state.undo(mark)
+
+
+def fix_combo(state: PropagationState, eq: int, combo: tuple[int]) -> bool:
+    """
+    Fixes the tiles of the equation to the combo, removes its numbers from
+    all the other tiles and propagates.
+
+    :return: False if some tile has no possibilities left.
     """
-    # print(depth)
-    # print(grid_possibilities)
-    if dim == depth:
-        # Bottom of generators.
-        yield grid_possibilities
+    tiles = state.eq_tiles[eq]
+    combo_bits = 0
+    for index, number in zip(tiles, combo):
+        state.restrict(index, 1 << number)  # Overwrite.
+        combo_bits |= 1 << number
+    # And delete them from anywhere else:
+    for delete_index in range(state.dimension ** 2):
+        if delete_index not in tiles and \
+                not state.restrict(delete_index, ~combo_bits):
+            return False
+    return iterative_deletion(state)
+
+
+def uses_all_numbers(state: PropagationState) -> bool:
+    """Whether the (single-digit) tiles use every number 1..dim^2."""
+    used = 0
+    for mask in state.domains:
+        used |= mask
+    return used == to_bitmask(range(1, state.dimension ** 2 + 1))
+
+
+def split_search(state: PropagationState, levels: int,
+                 branching=fewest_combos, depth: int = 0):
+    """
+    Expands the search tree of rows_recursively the given number of levels.
+    Yields, in the order the serial search would reach them:
+        ("solution", entries) for solutions found on the way,
+        ("subtree", (depth, domains, columns)) for the unsolved sub-states,
+    the latter being what resume_search continues from.
+    """
+    if not levels:
+        yield "subtree", (depth, state.domains[:], state.columns[:])
+        return
+    eq = branching(state)
+    if eq is None:
+        if uses_all_numbers(state):
+            yield "solution", state.snapshot()
+        return
+    stats = state.stats
+    for new_combo in state.combos_of(eq):
+        mark = state.mark()
+        consistent = fix_combo(state, eq, new_combo)
+        if stats is not None:
+            stats.node(depth + 1, eq, new_combo, consistent)
+        if consistent:
+            if all(map(is_singleton, state.domains)):
+                if uses_all_numbers(state):
+                    yield "solution", state.snapshot()
+                elif stats is not None:
+                    stats.dead_ends += 1
+            else:
+                yield from split_search(state, levels - 1, branching,
+                                        depth + 1)
+        state.undo(mark)
+
+
+def resume_search(dimension: int, subtree, branching=fewest_combos,
+                  collect_stats: bool = False):
+    """All solutions below a sub-state from split_search. This runs in the
+    worker processes, so the state is rebuilt from plain data.
+
+    :return: (solutions, SearchStats of this subtree or None)."""
+    depth, domains, columns = subtree
+    state = PropagationState(dimension, columns)
+    if collect_stats:
+        state.stats = SearchStats()
+    for tile, mask in enumerate(domains):
+        state.restrict(tile, mask)
+    if not iterative_deletion(state):
+        return [], state.stats
+    return list(rows_recursively(state, depth, branching)), state.stats
+
+
+def parallel_search(state: PropagationState, workers: int, levels: int = 2,
+                    branching=fewest_combos):
+    """
+    Solves the sub-states of split_search on a process pool and yields the
+    solutions in the order of the serial search, whatever order the
+    sub-states finish in. The pool takes the sub-states in turn, so an idle
+    worker always picks up the next unsolved one.
+    """
+    collect_stats = state.stats is not None
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        pieces = []  # Solutions, or futures of the sub-states' solutions.
+        for kind, item in split_search(state, levels, branching):
+            if kind == "solution":
+                pieces.append([item])
+            else:
+                pieces.append(executor.submit(resume_search, state.dimension,
+                                              item, branching, collect_stats))
+        for piece in pieces:
+            if isinstance(piece, list):
+                yield from piece
+                continue
+            solutions, subtree_stats = piece.result()
+            if collect_stats:
+                state.stats.merge(subtree_stats)
+            yield from solutions
+    finally:
+        # When the caller stops early (e.g. a limit), do not wait for the
+        # sub-states still running.
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def iter_solutions(grid: Square, limit: int | None = None, options=None,
+                   branching=fewest_combos, workers: int | None = None,
+                   split_levels: int = 2, stats: SearchStats | None = None,
+                   backend: str = "propagation"):
+    """
+    Lazily yields the solutions of the square as soon as they are found.
+    Each solution is a tuple of the entries, row by row; turning it into a
+    Square (grid.copy_with_entries) is left to the caller.
+
+    :param grid: The square to solve.
+    :param limit: Stop after this many solutions (None for all of them).
+    :param options: Options of all equations, computed if not given.
+    :param branching: Policy choosing the next equation to branch on,
+        see rows_recursively.
+    :param workers: Searches the tree of this one square on a process pool
+        of this size (see parallel_search); None or 1 searches in-process.
+        The solutions come out in the same order either way.
+    :param split_levels: How many levels to expand before handing the
+        sub-states to the workers.
+    :param stats: If given, a SearchStats that gets filled in as the search
+        goes (and whose hooks get called).
+    :param backend: "propagation" for the search above, or "dlx" for the
+        exact cover search of dlx.py (in-process only; it ignores branching
+        and finds the solutions in another order).
+    """
+    if backend not in ("propagation", "dlx"):
+        raise ValueError(f"Unknown backend '{backend}'.")
+    if backend == "dlx" and workers is not None and workers > 1:
+        raise ValueError("The dlx backend does not use workers.")
+    if limit is not None and limit <= 0:
+        return
+    start = perf_counter()
+    if options is None:
+        options = grid.options_in_all_equations(
+            deadline=None if stats is None else stats.deadline)
+    if backend == "dlx":
+        state = None
     else:
-        for new_row in combos[depth]:
-            limited_possible = deepcopy(grid_possibilities)  # Copy over.
-            for index, number in enumerate(new_row, start=depth * dim):
-                limited_possible[index] = {number}  # Overwrite.
-                # And delete it from anywhere else:
-                for delete_index in range((depth + 1) * dim, dim ** 2):
-                    limited_possible[delete_index].discard(number)
-            # print(limited_possible)
-            for options in limited_possible:
-                if not options:
-                    break
-            else:  # I.e. if every tile has a possibility remaining.
-                cs_left, maybe_s = iterative_deletion(
-                    dim, limited_possible, combos
-                )
-                # print(maybe_s)
-                if not maybe_s:  # There is a tile with no possibilities, skip
-                    continue
-                elif sum(map(len, maybe_s)) == dim ** 2:
-                    # Already we have a single digit everywhere.
-                    if set(map(lambda x: next(iter(x)), maybe_s)) ==\
-                            set(range(1, dim ** 2 + 1)):
-                        # Now we checked that we used all the digits.
-                        yield maybe_s
-                else:
-                    yield from rows_recursively(dim, depth+1, cs_left, maybe_s)
+        state = PropagationState(
+            grid.dimension,
+            [pack_combos(grid.dimension, combos) for combos, _ in options]
+        )
+    if stats is not None:
+        stats.setup_seconds += perf_counter() - start
+        stats.combos_generated = [len(combos) for combos, _ in options]
+        if state is not None:
+            state.stats = stats
+    if backend == "dlx":
+        solutions = dlx_solutions(grid.dimension, options, stats)
+    # Iteratively reduce the possibilities:
+    elif not iterative_deletion(state):  # Early break if no solutions
+        return
+    elif workers is None or workers <= 1:
+        solutions = rows_recursively(state, 0, branching)
+    else:
+        solutions = parallel_search(state, workers, split_levels, branching)
+    if limit is not None:
+        solutions = islice(solutions, limit)
+    if stats is None:
+        yield from solutions
+        return
+    # Only the time spent searching counts, not the time of the caller:
+    start = perf_counter()
+    for solution in solutions:
+        stats.search_seconds += perf_counter() - start
+        stats.solution(solution)
+        yield solution
+        start = perf_counter()
+    stats.search_seconds += perf_counter() - start
 
 
-def possibility_collapse(grid: Square) -> list[Square] | Square | None:
+def possibility_collapse(
+    grid: Square, options=None, branching=fewest_combos,
+    workers: int | None = None, stats: SearchStats | None = None,
+    backend: str = "propagation"
+) -> list[Square] | Square | None:
     """Finds ALL solutions of the given arithmetic square.
 
-    This function first calculates all possibilities in all rows/columns, then
+    This function first calculates all possibilities in all rows/columns
+    (unless these options are given, as from equation_table), then
     iteratively reduces these options.
 
-    To finish, it recurses down the rows."""
-    combos_and_tiles = grid.options_in_all_equations()
-    grid_possibilities = []
-    d_sq = grid.dimension ** 2
-    for index in range(d_sq):
-        q, r = divmod(index, grid.dimension)
-        row_possible = combos_and_tiles[q][1][r]
-        column_possible = combos_and_tiles[grid.dimension + r][1][q]
-        grid_possibilities.append(row_possible.intersection(column_possible))
-    combos = [combos_and_tiles[i][0] for i in range(2 * grid.dimension)]
-    # Iteratively reduce the possibilities:
-    remaining_combos, grid_possibilities =\
-        iterative_deletion(grid.dimension, grid_possibilities, combos)
-    if not grid_possibilities:  # Early break if no solutions
-        return None
+    To finish, it recurses down the rows and columns, in the order the
+    branching policy picks (see rows_recursively); on a pool of processes
+    if workers is given (see parallel_search).
+    A SearchStats passed as stats gets filled in with where the time went.
+    With backend="dlx", the exact cover search of dlx.py is used instead
+    (see iter_solutions)."""
     solution_list = []
-    for solution in rows_recursively(grid.dimension, 0,
-                                     remaining_combos, grid_possibilities):
-        copied_grid = deepcopy(grid)
-        for index in range(d_sq):
-            tile_entry = solution[index].pop()
-            copied_grid.single_entry_change(index, tile_entry)
-        solution_list.append(copied_grid)
+    for solution in iter_solutions(grid, options=options, branching=branching,
+                                   workers=workers, stats=stats,
+                                   backend=backend):
+        solution_list.append(grid.copy_with_entries(solution))
     if not solution_list:
         # No solutions.
         return None
@@ -190,22 +661,144 @@ def possibility_collapse(grid: Square) -> list[Square] | Square | None:
     return solution_list
 
 
-def given_result_list(operations: list[str], results: list[int]) -> dict:
+def first_and_count(grid: Square,
+                    cap: int | None = None) -> tuple[tuple[int] | None, int]:
+    """
+    Counts the solutions, keeping only the first one, in a single search.
+
+    :param grid: The square to solve.
+    :param cap: Stop counting once this many were found (None: count all).
+    :return: (the entries of the first solution, or None if there is none;
+        the number of solutions, at most cap).
+    """
+    first, count = None, 0
+    for entries in iter_solutions(grid, limit=cap):
+        if first is None:
+            first = entries
+        count += 1
+    return first, count
+
+
+def count_solutions(grid: Square, cap: int | None = None) -> int:
+    """
+    Counts the solutions without building a Square for any of them.
+
+    :param grid: The square to solve.
+    :param cap: Stop counting once this many were found (None: count all).
+    :return: The number of solutions, at most cap.
+    """
+    return first_and_count(grid, cap)[1]
+
+
+def is_unique(grid: Square) -> bool:
+    """Whether the square has exactly one solution; stops at the second."""
+    return count_solutions(grid, cap=2) == 1
+
+
+MaskResult = namedtuple("MaskResult", ["mask", "solutions", "error"])
+
+
+def mask_equations(operations: list[str], mask: tuple[int]) -> list[str]:
+    """Appends the results of the mask to the operations."""
+    return [operation + str(number)
+            for operation, number in zip(operations, mask)]
+
+
+def mask_options(dimension: int, operations: list[str], mask: tuple[int]):
+    """The options of every equation of the mask, straight from the bucketed
+    equation tables; None if some equation cannot reach its target at all."""
+    options = []
+    for operation, target in zip(operations, mask):
+        table = equation_table(dimension, operation)
+        if target not in table:
+            return None
+        options.append(table[target])
+    return options
+
+
+def _solve_masks(dimension: int, operations: list[str],
+                 masks: list[tuple[int]]) -> list[MaskResult]:
+    """Solves a chunk of masks. A failing mask only records its error, so the
+    rest of the chunk still gets solved. Runs in the worker processes."""
+    chunk_results = []
+    for mask in masks:
+        try:
+            the_grid = Square(dimension, mask_equations(operations, mask))
+            options = mask_options(dimension, operations, mask)
+            solutions = list(iter_solutions(the_grid, options=options))
+        except Exception as error:
+            chunk_results.append(MaskResult(mask, [], repr(error)))
+        else:
+            chunk_results.append(MaskResult(mask, solutions, None))
+    return chunk_results
+
+
+def iter_result_masks(operations: list[str], results: list[int],
+                      workers: int | None = None, chunksize: int = 32):
+    """
+    Solves the square for every assignment (mask) of the results to the
+    equations, yielding a MaskResult per mask as soon as it is solved.
+    The solutions are tuples of the entries, row by row.
+
+    Every distinct operation string is enumerated once (see equation_table).
+    A mask giving some equation a target it cannot reach is rejected right
+    away, without building a Square; the others reuse the tables.
+
+    :param operations: Operations of all the equations, without results.
+    :param results: The results to distribute among the equations.
+    :param workers: Size of the process pool; None or 1 solves in-process.
+    :param chunksize: How many masks a worker gets at once.
+    """
     assert len(operations) == len(results)
     assert not(len(results) & 1)
     dimension = len(results) // 2
-    result_options: set[tuple[int]] = set(permutations(results))
+    result_options = []
+    for mask in sorted(set(permutations(results))):
+        if mask_options(dimension, operations, mask) is None:
+            yield MaskResult(mask, [], None)
+        else:
+            result_options.append(mask)
+    if workers is None or workers <= 1:
+        for mask in result_options:
+            yield from _solve_masks(dimension, operations, [mask])
+        return
+    executor = ProcessPoolExecutor(max_workers=workers)
+    try:
+        futures = {}
+        for start in range(0, len(result_options), chunksize):
+            chunk = result_options[start:start + chunksize]
+            future = executor.submit(_solve_masks, dimension, operations, chunk)
+            futures[future] = chunk
+        for future in as_completed(futures):
+            try:
+                chunk_results = future.result()
+            except Exception as error:  # The worker itself went down.
+                chunk_results = [MaskResult(mask, [], repr(error))
+                                 for mask in futures[future]]
+            yield from chunk_results
+    finally:
+        executor.shutdown(cancel_futures=True)
+
+
+def given_result_list(operations: list[str], results: list[int],
+                      workers: int | None = None, chunksize: int = 32) -> dict:
+    """Solutions of every solvable mask (see iter_result_masks), keyed by the
+    mask in sorted order; so the same for any number of workers.
+    Masks that failed to solve are reported as warnings."""
+    dimension = len(results) // 2
+    found = {}
+    for mask, solutions, error in iter_result_masks(operations, results,
+                                                     workers, chunksize):
+        if error is not None:
+            warnings.warn(f"Solving the mask {mask} failed: {error}")
+        elif solutions:
+            found[mask] = solutions
     solution_dict = {}
-    for mask in result_options:
-        # print(mask)
-        true_operations = operations[:]
-        for index, number in enumerate(mask):
-            true_operations[index] = true_operations[index] + str(number)
-        # print(true_operations)
-        the_grid = Square(dimension, true_operations)
-        potential_solutions = possibility_collapse(the_grid)
-        if potential_solutions is not None:
-            solution_dict[mask] = potential_solutions
+    for mask in sorted(found):
+        the_grid = Square(dimension, mask_equations(operations, mask))
+        squares = [the_grid.copy_with_entries(entries)
+                   for entries in found[mask]]
+        solution_dict[mask] = squares[0] if len(squares) == 1 else squares
     return solution_dict
 
 
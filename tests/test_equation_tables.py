@@ -0,0 +1,47 @@
+from itertools import product
+import pytest
+from equation_tables import EquationTables, mapped_tables, table_path,\
+    write_tables
+from puzzle_class import enumerate_equation
+
+
+OPERATIONS_3 = sorted("".join(ops) for ops in product("+-*/", repeat=2))
+
+
+@pytest.fixture
+def table_directory(tmp_path, monkeypatch):
+    monkeypatch.setenv("ARITHMETIC_SQUARES_TABLES", str(tmp_path))
+    mapped_tables.cache_clear()
+    yield tmp_path
+    mapped_tables.cache_clear()
+
+
+def test_tables_round_trip(table_directory):
+    path = table_path(3)
+    assert path == str(table_directory / "equations_3.bin")
+    write_tables(3, path)
+    tables = mapped_tables(3)
+    assert isinstance(tables, EquationTables)
+    assert sorted(tables.operations()) == OPERATIONS_3
+    for ops in OPERATIONS_3:
+        items = list(tables.items(ops))
+        assert [target for target, _ in items] == \
+            sorted(target for target, _ in items)
+        for target, combos in items:
+            assert list(combos) == enumerate_equation(3, ops, target)
+            assert tables.combos(ops, target) == combos
+        assert tables.combos(ops, 10 ** 6) == ()
+    assert tables.combos("**+", 6) is None
+
+
+def test_interrupted_write_leaves_no_files(table_directory):
+    done = []
+
+    def report(ops):
+        done.append(ops)
+        if len(done) == 3:
+            raise KeyboardInterrupt
+
+    with pytest.raises(KeyboardInterrupt):
+        write_tables(3, table_path(3), report=report)
+    assert list(table_directory.iterdir()) == []
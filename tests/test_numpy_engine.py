@@ -0,0 +1,34 @@
+from itertools import product
+import pytest
+from puzzle_class import EQUATION_CACHE, Square, equation_table
+
+pytest.importorskip("numpy")
+import numpy_engine  # noqa: E402 (needs NumPy)
+
+
+@pytest.mark.parametrize("operations",
+                         ["".join(ops) for ops in product("+-*/", repeat=2)])
+def test_matches_python_on_3x3(operations):
+    # Every reachable target, plus some that are not:
+    targets = set(equation_table(3, operations)) | {-100, 0, 1, 1000}
+    assert numpy_engine.verify_against_python(3, operations, targets)
+
+
+@pytest.mark.parametrize("operations", ["/-*", "+*-", "*/+", "--/"])
+def test_matches_python_on_4x4(operations):
+    assert numpy_engine.verify_against_python(4, operations, range(-5, 30))
+
+
+@pytest.mark.parametrize("dimension, equations", [
+    (3, ["+-6", "-*8", "*/3", "+-4", "-*3", "*/4"]),
+    (3, ["/*2", "*-1", "+-4", "/*2", "*-1", "-+8"]),
+    (4, ["++-2", "*--15", "+-*96", "--/-1",
+         "--/-1", "++-4", "*-+25", "+*/9"]),
+])
+def test_options_of_both_engines(dimension, equations):
+    EQUATION_CACHE.clear()
+    from_numpy = Square(dimension, equations).options_in_all_equations(
+        engine="numpy")
+    EQUATION_CACHE.clear()
+    from_python = Square(dimension, equations).options_in_all_equations()
+    assert from_numpy == from_python
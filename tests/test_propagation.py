@@ -0,0 +1,17 @@
+from solution_options import PropagationState, iterative_deletion,\
+    pack_combos, rows_recursively
+
+
+def repeating_state() -> PropagationState:
+    """A 2x2 state whose only combos fill the tiles with 1, 2, 1, 2."""
+    combos = [[(1, 2)], [(1, 2)], [(1, 1)], [(2, 2)]]
+    return PropagationState(2, [pack_combos(2, combo) for combo in combos])
+
+
+def test_leaf_rejects_repeated_numbers_by_itself():
+    # Without all_different, every tile is already a single number here.
+    assert list(rows_recursively(repeating_state())) == []
+
+
+def test_all_different_rejects_repeated_numbers():
+    assert not iterative_deletion(repeating_state())
@@ -0,0 +1,114 @@
+import asyncio
+import json
+import time
+import pytest
+from service import SolverService
+
+
+UNIQUE_33 = ["+-6", "-*8", "*/3", "+-4", "-*3", "*/4"]
+MAGIC_33 = ["++15"] * 6  # 72 solutions.
+# Enumerating the options of this one takes some 20 seconds.
+SLOW_55 = ["++**30096", "+-*+265", "-*+*4", "+--*-240", "+-+*145",
+           "+--+2", "-**+-459", "+**-777", "+*-*5643", "**-*2320"]
+
+
+@pytest.fixture(scope="module")
+def service():
+    solver_service = SolverService(workers=2, timeout=10.0)
+    yield solver_service
+    solver_service.close()
+
+
+def exchange(service: SolverService, lines: list, answers: int) -> list:
+    """Sends the lines (objects or raw strings) to the service on localhost
+    and returns the first answers responses, in the order they came."""
+    async def talk():
+        server = await asyncio.start_server(service.handle_connection,
+                                            "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        async with server:
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            for line in lines:
+                if not isinstance(line, str):
+                    line = json.dumps(line)
+                writer.write((line + "\n").encode())
+                await writer.drain()
+                # Lets the service read each line before the next:
+                await asyncio.sleep(0.05)
+            responses = [json.loads(await reader.readline())
+                         for _ in range(answers)]
+            writer.close()
+            await writer.wait_closed()
+            return responses
+
+    return asyncio.run(talk())
+
+
+def test_unique_grid(service):
+    [response] = exchange(service, [{"id": 1, "size": 3,
+                                     "equations": UNIQUE_33}], 1)
+    assert response["id"] == 1
+    assert response["status"] == "unique"
+    assert response["complete"]
+    assert response["solutions"] == [[5, 7, 6, 8, 4, 2, 9, 1, 3]]
+
+
+def test_max_solutions(service):
+    [response] = exchange(service, [{"id": "cap", "size": 3,
+                                     "equations": MAGIC_33,
+                                     "max_solutions": 3}], 1)
+    assert response["status"] == "multiple"
+    assert not response["complete"]
+    assert response["stopped"] == "solutions"
+    assert len(response["solutions"]) == 3
+
+
+def test_max_nodes(service):
+    [response] = exchange(service, [{"id": 2, "size": 3,
+                                     "equations": MAGIC_33,
+                                     "max_nodes": 1}], 1)
+    assert not response["complete"]
+    assert response["stopped"] == "nodes"
+
+
+def test_timeout_stops_the_setup(service):
+    start = time.monotonic()
+    [response] = exchange(service, [{"id": 3, "size": 5,
+                                     "equations": SLOW_55,
+                                     "timeout": 0.5}], 1)
+    assert response["status"] == "unknown"
+    assert response["stopped"] == "time"
+    assert time.monotonic() - start < 3
+
+
+def test_cancel(service):
+    responses = exchange(service, [
+        {"id": 4, "size": 5, "equations": SLOW_55, "timeout": 1.0},
+        {"cancel": 4},
+    ], 1)
+    assert responses[0]["id"] == 4
+    assert responses[0]["status"] == "cancelled"
+
+
+def test_identical_requests_share_a_job(service, monkeypatch):
+    submitted = []
+    submit = service.executor.submit
+
+    def counting_submit(*arguments):
+        submitted.append(arguments)
+        return submit(*arguments)
+
+    monkeypatch.setattr(service.executor, "submit", counting_submit)
+    request = {"size": 5, "equations": SLOW_55, "timeout": 0.5}
+    responses = exchange(service, [dict(request, id=5),
+                                   dict(request, id=6)], 2)
+    assert len(submitted) == 1
+    assert sorted(response["id"] for response in responses) == [5, 6]
+    assert all(response["stopped"] == "time" for response in responses)
+
+
+def test_malformed_line(service):
+    responses = exchange(service, ["this is not JSON", "[1, 2]"], 2)
+    for response in responses:
+        assert response["id"] is None
+        assert response["status"] == "error"